@@ -29,14 +29,11 @@ WORD2VECF_OPTS=${PARAM_CHECK[3]}
 SGNS2TEXT_OPTS=${PARAM_CHECK[4]}
 
 
-# Clean the corpus from non alpha-numeric symbols
-scripts/clean_corpus.sh $CORPUS > $CORPUS.clean
-
-
-# Create collection of word-context pairs
+# Create collection of word-context pairs, cleaning the (possibly compressed) corpus from non alpha-numeric symbols
+# on the fly
 mkdir $OUTPUT_DIR
-python hyperwords/corpus2pairs.py $CORPUS2PAIRS_OPTS $CORPUS.clean > $OUTPUT_DIR/pairs
-scripts/pairs2counts.sh $OUTPUT_DIR/pairs > $OUTPUT_DIR/counts
+python hyperwords/corpus2pairs.py --clean $CORPUS2PAIRS_OPTS $CORPUS > $OUTPUT_DIR/pairs
+python hyperwords/pairs2counts.py $OUTPUT_DIR/pairs > $OUTPUT_DIR/counts
 python hyperwords/counts2vocab.py $OUTPUT_DIR/counts
 
 
@@ -51,7 +48,6 @@ python hyperwords/sgns2text.py $SGNS2TEXT_OPTS $OUTPUT_DIR/sgns $OUTPUT_DIR/vect
 
 
 # Remove temporary files
-#rm $CORPUS.clean
 #rm $OUTPUT_DIR/pairs
 #rm $OUTPUT_DIR/counts*
 #rm $OUTPUT_DIR/sgns*
@@ -24,19 +24,10 @@ PMI2SVD_OPTS=${PARAM_CHECK[4]}
 SVD2TEXT_OPTS=${PARAM_CHECK[5]}
 
 
-# Clean the corpus from non alpha-numeric symbols
-scripts/clean_corpus.sh $CORPUS > $CORPUS.clean
-
-
-# Create collection of word-context pairs
+# Clean the (possibly compressed) corpus from non alpha-numeric symbols on the fly, count word-context pairs, and
+# calculate the PMI matrix in a single pass (without writing the cleaned corpus, pairs, and counts)
 mkdir $OUTPUT_DIR
-python hyperwords/corpus2pairs.py $CORPUS2PAIRS_OPTS $CORPUS.clean > $OUTPUT_DIR/pairs
-scripts/pairs2counts.sh $OUTPUT_DIR/pairs > $OUTPUT_DIR/counts
-python hyperwords/counts2vocab.py $OUTPUT_DIR/counts
-
-
-# Calculate PMI matrices for each collection of pairs
-python hyperwords/counts2pmi.py $COUNTS2PMI_OPTS $OUTPUT_DIR/counts $OUTPUT_DIR/pmi
+python hyperwords/corpus2pmi.py --clean $CORPUS2PAIRS_OPTS $COUNTS2PMI_OPTS $CORPUS $OUTPUT_DIR/pmi
 
 
 # Create embeddings with SVD
@@ -50,8 +41,5 @@ python hyperwords/svd2text.py $SVD2TEXT_OPTS $OUTPUT_DIR/svd $OUTPUT_DIR/vectors
 
 
 # Remove temporary files
-#rm $CORPUS.clean
-#rm $OUTPUT_DIR/pairs
-#rm $OUTPUT_DIR/counts*
 #rm $OUTPUT_DIR/pmi*
 #rm $OUTPUT_DIR/svd*
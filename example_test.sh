@@ -8,25 +8,22 @@ fi
 
 # Download corpus. We chose a small corpus for the example, and larger corpora will yield better results.
 wget http://www.statmt.org/wmt14/training-monolingual-news-crawl/news.2010.en.shuffled.gz
-gzip -d news.2010.en.shuffled.gz
-CORPUS=news.2010.en.shuffled
+CORPUS=news.2010.en.shuffled.gz
 
-# Clean the corpus from non alpha-numeric symbols
-scripts/clean_corpus.sh $CORPUS > $CORPUS.clean
 
-
-# Create two example collections of word-context pairs:
+# Create two example collections of word-context pairs, reading the compressed corpus and cleaning it from non
+# alpha-numeric symbols on the fly (--clean):
 
 # A) Window size 2 with "clean" subsampling
 mkdir w2.sub
-python hyperwords/corpus2pairs.py --win 2 --sub 1e-5 ${CORPUS}.clean > w2.sub/pairs
-scripts/pairs2counts.sh w2.sub/pairs > w2.sub/counts
+python hyperwords/corpus2pairs.py --clean --win 2 --sub 1e-5 ${CORPUS} > w2.sub/pairs
+python hyperwords/pairs2counts.py w2.sub/pairs > w2.sub/counts
 python hyperwords/counts2vocab.py w2.sub/counts
 
 # B) Window size 5 with dynamic contexts and "dirty" subsampling
 mkdir w5.dyn.sub.del
-python hyperwords/corpus2pairs.py --win 5 --dyn --sub 1e-5 --del ${CORPUS}.clean > w5.dyn.sub.del/pairs
-scripts/pairs2counts.sh w5.dyn.sub.del/pairs > w5.dyn.sub.del/counts
+python hyperwords/corpus2pairs.py --clean --win 5 --dyn --sub 1e-5 --del ${CORPUS} > w5.dyn.sub.del/pairs
+python hyperwords/pairs2counts.py w5.dyn.sub.del/pairs > w5.dyn.sub.del/counts
 python hyperwords/counts2vocab.py w5.dyn.sub.del/counts
 
 # Calculate PMI matrices for each collection of pairs
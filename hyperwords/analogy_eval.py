@@ -1,105 +1,127 @@
-from __builtin__ import sorted
-
-from docopt import docopt
-import numpy as np
-
-from representations.representation_factory import create_representation
-
-
-def main():
-    args = docopt("""
-    Usage:
-        analogy_eval.py [options] <representation> <representation_path> <task_path>
-    
-    Options:
-        --neg NUM    Number of negative samples; subtracts its log from PMI (only applicable to PPMI) [default: 1]
-        --w+c        Use ensemble of word and context vectors (not applicable to PPMI)
-        --eig NUM    Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
-    """)
-    
-    data = read_test_set(args['<task_path>'])
-    xi, ix = get_vocab(data)
-    representation = create_representation(args)
-    accuracy_add, accuracy_mul = evaluate(representation, data, xi, ix)
-    print args['<representation>'], args['<representation_path>'], '\t%0.3f' % accuracy_add, '\t%0.3f' % accuracy_mul
-
-
-def read_test_set(path):
-    test = []
-    with open(path) as f:
-        for line in f:
-            analogy = line.strip().lower().split()
-            test.append(analogy)
-    return test 
-
-
-def get_vocab(data):
-    vocab = set()
-    for analogy in data:
-        vocab.update(analogy)
-    vocab = sorted(vocab)
-    return dict([(a, i) for i, a in enumerate(vocab)]), vocab
-
-
-def evaluate(representation, data, xi, ix):
-    sims = prepare_similarities(representation, ix)
-    correct_add = 0.0
-    correct_mul = 0.0
-    for a, a_, b, b_ in data:
-        b_add, b_mul = guess(representation, sims, xi, a, a_, b)
-        if b_add == b_:
-            correct_add += 1
-        if b_mul == b_:
-            correct_mul += 1
-    return correct_add/len(data), correct_mul/len(data)
-
-
-def prepare_similarities(representation, vocab):
-    vocab_representation = representation.m[[representation.wi[w] if w in representation.wi else 0 for w in vocab]]
-    sims = vocab_representation.dot(representation.m.T)
-    
-    dummy = None
-    for w in vocab:
-        if w not in representation.wi:
-            dummy = representation.represent(w)
-            break
-    if dummy is not None:
-        for i, w in enumerate(vocab):
-            if w not in representation.wi:
-                vocab_representation[i] = dummy
-    
-    if type(sims) is not np.ndarray:
-        sims = np.array(sims.todense())
-    else:
-        sims = (sims+1)/2
-    return sims
-
-
-def guess(representation, sims, xi, a, a_, b):
-    sa = sims[xi[a]]
-    sa_ = sims[xi[a_]]
-    sb = sims[xi[b]]
-    
-    add_sim = -sa+sa_+sb
-    if a in representation.wi:
-        add_sim[representation.wi[a]] = 0
-    if a_ in representation.wi:
-        add_sim[representation.wi[a_]] = 0
-    if b in representation.wi:
-        add_sim[representation.wi[b]] = 0
-    b_add = representation.iw[np.nanargmax(add_sim)]
-    
-    mul_sim = sa_*sb*np.reciprocal(sa+0.01)
-    if a in representation.wi:
-        mul_sim[representation.wi[a]] = 0
-    if a_ in representation.wi:
-        mul_sim[representation.wi[a_]] = 0
-    if b in representation.wi:
-        mul_sim[representation.wi[b]] = 0
-    b_mul = representation.iw[np.nanargmax(mul_sim)]
-    
-    return b_add, b_mul
-
-
-if __name__ == '__main__':
-    main()
+from __builtin__ import sorted
+from multiprocessing.pool import ThreadPool
+
+from docopt import docopt
+import numpy as np
+
+from representations.representation_factory import create_representation
+
+
+def main():
+    args = docopt("""
+    Usage:
+        analogy_eval.py [options] <representation> <representation_path> <task_path>
+    
+    Options:
+        --neg NUM       Number of negative samples; subtracts its log from PMI (only applicable to PPMI) [default: 1]
+        --w+c           Use ensemble of word and context vectors (not applicable to PPMI)
+        --eig NUM       Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
+        --mmap          Memory-map the embedding instead of reading it (not applicable to PPMI)
+        --cache DIR     Cache the built representations in DIR (e.g. ~/.cache/hyperwords), for later runs to reuse
+        --cache-mb NUM  Size limit of the cache in megabytes; least recently used entries are evicted [default: 4096]
+        --block NUM     Number of questions solved together; bounds memory to about 3 x NUM x |V| similarities [default: 50]
+        --threads NUM   Number of threads solving blocks of questions [default: 1]
+        --restrict NUM  Only consider the NUM most frequent words (according to --freq) as answers
+        --freq PATH     Count vocabulary that defines the most frequent words (e.g. counts.words.vocab)
+    """)
+    
+    if args['--restrict'] is not None and args['--freq'] is None:
+        # The rows of PPMI and SVD representations are sorted alphabetically, not by frequency.
+        raise Exception('--restrict requires --freq.')
+    data = read_test_set(args['<task_path>'])
+    representation = create_representation(args)
+    candidates = None
+    if args['--restrict'] is not None:
+        frequent = read_frequent_words(args['--freq'], int(args['--restrict']))
+        candidates = np.array(sorted([representation.wi[w] for w in frequent if w in representation.wi]))
+    accuracy_add, accuracy_mul = evaluate(representation, data, int(args['--block']), int(args['--threads']),
+                                          candidates)
+    print args['<representation>'], args['<representation_path>'], '\t%0.3f' % accuracy_add, '\t%0.3f' % accuracy_mul
+
+
+def read_test_set(path):
+    test = []
+    with open(path) as f:
+        for line in f:
+            analogy = line.strip().lower().split()
+            test.append(analogy)
+    return test 
+
+
+def evaluate(representation, data, block_size=50, threads=1, candidates=None):
+    """
+    Solves the analogies in blocks of block_size questions (in a pool of threads if threads > 1), with matrix
+    operations over the similarities of each block's words to all the candidate answers (by default, the whole
+    vocabulary). Returns the accuracies of 3CosAdd and 3CosMul.
+    """
+    if candidates is None:
+        candidates = np.arange(len(representation.iw))
+        candidate_m = representation.m
+    else:
+        candidate_m = representation.m[candidates]
+    blocks = [data[start:start + block_size] for start in xrange(0, len(data), block_size)]
+    if threads > 1:
+        pool = ThreadPool(threads)
+        try:
+            results = pool.map(lambda block: evaluate_block(representation, candidate_m, candidates, block), blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [evaluate_block(representation, candidate_m, candidates, block) for block in blocks]
+    correct_add = float(sum([add for add, mul in results]))
+    correct_mul = float(sum([mul for add, mul in results]))
+    return correct_add/len(data), correct_mul/len(data)
+
+
+def evaluate_block(representation, candidate_m, candidates, block):
+    """
+    Returns the numbers of questions in the block that 3CosAdd and 3CosMul answer correctly.
+    Out-of-vocabulary question words are represented (as they always were) by the first word's vector.
+    """
+    vocab = sorted(set([w for a, a_, b, b_ in block for w in (a, a_, b)]))
+    xi = dict([(w, i) for i, w in enumerate(vocab)])
+    sims = prepare_similarities(representation, candidate_m, vocab)
+
+    columns = dict([(int(c), i) for i, c in enumerate(candidates)])
+    rows = np.arange(len(block))
+    add_sim = -sims[[xi[a] for a, a_, b, b_ in block]] + sims[[xi[a_] for a, a_, b, b_ in block]]
+    add_sim += sims[[xi[b] for a, a_, b, b_ in block]]
+    mul_sim = sims[[xi[a_] for a, a_, b, b_ in block]] * sims[[xi[b] for a, a_, b, b_ in block]]
+    mul_sim *= np.reciprocal(sims[[xi[a] for a, a_, b, b_ in block]] + 0.01)
+    for position in xrange(3):
+        question_columns = np.array([columns.get(representation.wi[question[position]], -1)
+                                     if question[position] in representation.wi else -1 for question in block])
+        excluded = question_columns >= 0
+        add_sim[rows[excluded], question_columns[excluded]] = 0
+        mul_sim[rows[excluded], question_columns[excluded]] = 0
+
+    b_add = candidates[np.nanargmax(add_sim, axis=1)]
+    b_mul = candidates[np.nanargmax(mul_sim, axis=1)]
+    correct_add = sum([representation.iw[i] == question[3] for i, question in zip(b_add, block)])
+    correct_mul = sum([representation.iw[i] == question[3] for i, question in zip(b_mul, block)])
+    return correct_add, correct_mul
+
+
+def prepare_similarities(representation, candidate_m, vocab):
+    vocab_representation = representation.m[[representation.wi[w] if w in representation.wi else 0 for w in vocab]]
+    sims = vocab_representation.dot(candidate_m.T)
+    if type(sims) is not np.ndarray:
+        sims = np.array(sims.todense())
+    else:
+        sims = (sims+1)/2
+    return sims
+
+
+def read_frequent_words(path, n):
+    """
+    Reads the n most frequent words of a count vocabulary.
+    """
+    with open(path) as f:
+        counts = [line.strip().split() for line in f if len(line) > 0]
+    counts.sort(key=lambda (w, c): -int(c))
+    return [w for w, c in counts[:n]]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import time
+
+from docopt import docopt
+import numpy as np
+
+from representations.ann_index import IVFIndex
+from representations.representation_factory import build_representation, maps_as_is
+
+
+def main():
+    args = docopt("""
+    Usage:
+        ann_report.py [options] <representation> <representation_path> <index_path>
+    
+    Options:
+        --w+c           Use ensemble of word and context vectors
+        --eig NUM       Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
+        --queries NUM   Number of random query words [default: 1000]
+        --nprobe LIST   Comma-separated numbers of lists to probe [default: 1,2,4,8,16,32,64]
+        --n NUM         Number of neighbours [default: 10]
+    """)
+    
+    rep_type = args['<representation>']
+    path = args['<representation_path>']
+    w_c = args['--w+c']
+    eig = float(args['--eig'])
+    num_queries = int(args['--queries'])
+    n = int(args['--n'])
+    
+    # Map the vectors only if they are used as they are saved (otherwise mapping them would not save the copy).
+    embedding = build_representation(rep_type, path, 1, w_c, eig, maps_as_is(rep_type, path, w_c))
+    index = IVFIndex(args['<index_path>'])
+    rnd = np.random.RandomState(17)
+    words = [embedding.iw[i] for i in rnd.choice(len(embedding.iw), min(num_queries, len(embedding.iw)), replace=False)]
+    queries = np.vstack([embedding.represent(w) for w in words])
+    
+    start = time.time()
+    for w in words:
+        embedding.closest(w, n)
+    exact_ms = 1000 * (time.time() - start) / len(words)
+    exact = [set(row) for row in embedding.closest_batch(words, n)[0]]
+    
+    print '\t'.join(['nprobe', 'ms/query', 'recall@%d' % n])
+    print '\t'.join(['exact', '%0.3f' % exact_ms, '1.000'])
+    for nprobe in [int(x) for x in args['--nprobe'].split(',')]:
+        start = time.time()
+        for q in xrange(len(words)):
+            ids = index.search(queries[q], n, nprobe)[0]
+        ms = 1000 * (time.time() - start) / len(words)
+        ids = index.search(queries, n, nprobe)[0]
+        recall = np.mean([len(exact[q] & set(ids[q])) / float(n) for q in xrange(len(words))])
+        print '\t'.join([str(nprobe), '%0.3f' % ms, '%0.3f' % recall])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+from itertools import izip
+
+from docopt import docopt
+
+from representations.matrix_serializer import load_binary_counts, save_count_vocabulary
+
+
+def main():
+    args = docopt("""
+    Usage:
+        bin2counts.py <counts_bin> <output_path>
+    """)
+
+    counts_path = args['<counts_bin>']
+    output_path = args['<output_path>']
+
+    rows, cols, counts, iw, sum_w, ic, sum_c = load_binary_counts(counts_path)
+    block_size = 100000
+    with open(output_path, 'w') as f:
+        for start in xrange(0, len(counts), block_size):
+            end = start + block_size
+            block = izip(counts[start:end].tolist(), rows[start:end].tolist(), cols[start:end].tolist())
+            f.write(''.join(['%d %s %s\n' % (n, iw[w], ic[c]) for n, w, c in block]))
+
+    words = sorted(zip(iw, sum_w.tolist()), key=lambda (x, y): y, reverse=True)
+    contexts = sorted(zip(ic, sum_c.tolist()), key=lambda (x, y): y, reverse=True)
+    save_count_vocabulary(output_path + '.words.vocab', words)
+    save_count_vocabulary(output_path + '.contexts.vocab', contexts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+from itertools import izip
+import os
+import tempfile
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from representations.matrix_serializer import save_binary_counts
+
+
+class CooccurrenceCounter:
+    """
+    Accumulates word-context co-occurrence counts over integer ids.
+    Every pair is packed into a single int64 key (word * num_contexts + context), so counting never builds Python
+    tuples or strings. New keys are buffered and periodically reduced into a sorted array of unique keys.
+    If a memory budget (in bytes) is given, it bounds the counter's peak memory, including the copies made while reducing:
+    the reduced keys are spilled to sorted runs on disk whenever they take more than a quarter of it, and the runs are
+    merged when the counts are read.
+    """
+
+    def __init__(self, num_words, num_contexts, buffer_size=10000000, memory=None, tmp_dir=None):
+        self.num_words = num_words
+        self.num_contexts = num_contexts
+        self.buffer_size = buffer_size
+        self.memory = memory
+        self.tmp_dir = tmp_dir
+        if memory is not None:
+            self.buffer_size = max(1, min(buffer_size, memory // (4 * REDUCE_BYTES)))
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.buffer_keys = []
+        self.buffer_counts = []
+        self.buffered = 0
+        self.runs = []
+
+    def update(self, words, contexts, weights=None):
+        """
+        Adds one occurrence (or weights[i] occurrences) of every pair (words[i], contexts[i]).
+        """
+        keys = np.asarray(words, dtype=np.int64) * self.num_contexts + np.asarray(contexts, dtype=np.int64)
+        if weights is None:
+            weights = np.ones(len(keys), dtype=np.int64)
+        self.buffer_keys.append(keys)
+        self.buffer_counts.append(np.asarray(weights, dtype=np.int64))
+        self.buffered += len(keys)
+        if self.buffered >= self.buffer_size:
+            self.reduce()
+
+    def merge(self, other):
+        """
+        Adds the counts of another counter over the same vocabularies, taking over its spilled runs.
+        """
+        self.buffer_keys.append(other.keys)
+        self.buffer_counts.append(other.counts)
+        self.buffer_keys.extend(other.buffer_keys)
+        self.buffer_counts.extend(other.buffer_counts)
+        self.buffered += len(other.keys) + other.buffered
+        self.runs.extend(other.runs)
+        other.runs = []
+        self.reduce()
+
+    def reduce(self):
+        if self.buffered == 0:
+            return
+        key_blocks = [self.keys] + self.buffer_keys
+        count_blocks = [self.counts] + self.buffer_counts
+        self.keys = self.counts = None
+        self.buffer_keys = []
+        self.buffer_counts = []
+        self.buffered = 0
+        self.keys, self.counts = reduce_blocks(key_blocks, count_blocks)
+        if self.memory is not None and len(self.keys) * REDUCE_BYTES > self.memory // 2:
+            self.spill()
+
+    def spill(self):
+        """
+        Writes the reduced keys and counts to a sorted run on disk and frees them.
+        """
+        fd, path = tempfile.mkstemp(suffix='.bin', prefix='counts.', dir=self.tmp_dir)
+        with os.fdopen(fd, 'wb') as f:
+            self.keys.tofile(f)
+            self.counts.tofile(f)
+        self.runs.append(path)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def close(self):
+        """
+        Removes the spilled runs.
+        """
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+
+    def iter_items(self, block_size=1000000):
+        """
+        Yields blocks of words, contexts, and counts of all distinct pairs, sorted by word and then by context.
+        Spilled runs are k-way merged from disk, so only about block_size pairs per run are in memory at once (fewer if
+        that would exceed the memory budget).
+        """
+        self.reduce()
+        if self.memory is not None:
+            block_size = max(1, min(block_size, self.memory // (REDUCE_BYTES * (len(self.runs) + 1))))
+        runs = []
+        for path in self.runs:
+            length = os.path.getsize(path) // ENTRY_BYTES
+            runs.append((RunSlices(path, 0, length), RunSlices(path, length, length)))
+        runs.append((self.keys, self.counts))
+        for keys, counts in merge_runs(runs, block_size):
+            yield keys // self.num_contexts, keys % self.num_contexts, counts
+
+    def items(self):
+        """
+        Returns the words, contexts, and counts of all distinct pairs, sorted by word and then by context.
+        """
+        self.reduce()
+        if len(self.runs) == 0:
+            return self.keys // self.num_contexts, self.keys % self.num_contexts, self.counts
+        blocks = zip(*self.iter_items())
+        return np.concatenate(blocks[0]), np.concatenate(blocks[1]), np.concatenate(blocks[2])
+
+    def tocsr(self, dtype=np.float32):
+        words, contexts, counts = self.items()
+        return coo_matrix((counts.astype(dtype), (words, contexts)), shape=(self.num_words, self.num_contexts)).tocsr()
+
+
+class RunSlices:
+    """
+    The keys or the counts of a spilled run (length int64 values from offset in the file at path), read a slice at a
+    time. Unlike a memory map, reading a run this way does not leave its pages resident.
+    """
+
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            assert step == 1
+            return self.read(start, max(start, stop))
+        if index < 0:
+            index += self.length
+        return self.read(index, index + 1)[0]
+
+    def read(self, start, stop):
+        with open(self.path, 'rb') as f:
+            f.seek((self.offset + start) * 8)
+            return np.fromfile(f, dtype=np.int64, count=stop - start)
+
+
+ENTRY_BYTES = 16
+# The peak memory per key while reducing: the keys and counts, the sort order, and one permuted copy.
+REDUCE_BYTES = 2 * ENTRY_BYTES
+
+
+def reduce_keys(keys, counts):
+    """
+    Sorts the keys and sums the counts of identical keys.
+    """
+    return reduce_blocks([keys], [counts])
+
+
+def reduce_blocks(key_blocks, count_blocks):
+    """
+    Concatenates blocks of keys and counts, sorts the keys, and sums the counts of identical keys. The lists of blocks
+    are emptied and every intermediate array is dropped as soon as possible, so that the peak stays at about
+    REDUCE_BYTES per key.
+    """
+    keys = np.concatenate(key_blocks)
+    del key_blocks[:]
+    counts = np.concatenate(count_blocks)
+    del count_blocks[:]
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    counts = counts[order]
+    del order
+    if len(keys) == 0:
+        return keys, counts
+    starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+    keys = keys[starts]
+    return keys, np.add.reduceat(counts, starts)
+
+
+def merge_runs(runs, block_size):
+    """
+    K-way merges sorted runs of unique keys (with their counts) into sorted, reduced blocks.
+    Each step takes every key up to the smallest last key among the runs' next blocks, so the blocks never overlap.
+    """
+    positions = [0] * len(runs)
+    while True:
+        active = [i for i, (keys, counts) in enumerate(runs) if positions[i] < len(keys)]
+        if len(active) == 0:
+            break
+        bound = min([runs[i][0][min(positions[i] + block_size, len(runs[i][0])) - 1] for i in active])
+        block_keys = []
+        block_counts = []
+        for i in active:
+            keys, counts = runs[i]
+            start = positions[i]
+            end = start + np.searchsorted(keys[start:start + block_size], bound, side='right')
+            block_keys.append(np.asarray(keys[start:end]))
+            block_counts.append(np.asarray(counts[start:end]))
+            positions[i] = end
+        yield reduce_blocks(block_keys, block_counts)
+
+
+def window_pairs(ids, win, windows=None):
+    """
+    Finds all pairs of in-vocabulary tokens (ids >= 0) that are at most win positions apart.
+    If windows is given, each word only sees contexts within its own (dynamic) window size windows[i].
+    Returns the positions of the words and the positions of their contexts.
+    """
+    positions = np.arange(len(ids))
+    word_positions = [np.zeros(0, dtype=positions.dtype)]
+    context_positions = [np.zeros(0, dtype=positions.dtype)]
+    for d in xrange(1, win + 1):
+        if d >= len(ids):
+            break
+        valid = (ids[:-d] >= 0) & (ids[d:] >= 0)
+        if windows is None:
+            forward = valid
+            backward = valid
+        else:
+            forward = valid & (windows[:-d] >= d)
+            backward = valid & (windows[d:] >= d)
+        word_positions.append(positions[:-d][forward])
+        context_positions.append(positions[d:][forward])
+        word_positions.append(positions[d:][backward])
+        context_positions.append(positions[:-d][backward])
+    return np.concatenate(word_positions), np.concatenate(context_positions)
+
+
+def iter_id_blocks(sentences, wi, win, block_size=1000000):
+    """
+    Maps the tokens of each sentence to their ids (-1 if out of vocabulary) and yields them in large blocks.
+    Consecutive sentences are separated by win placeholders, so windows never cross sentence boundaries.
+    """
+    padding = [-1] * win
+    ids = []
+    for tokens in sentences:
+        ids.extend([wi.get(t, -1) for t in tokens])
+        ids.extend(padding)
+        if len(ids) >= block_size:
+            yield np.array(ids, dtype=np.int64)
+            ids = []
+    if len(ids) > 0:
+        yield np.array(ids, dtype=np.int64)
+
+
+def compact_counts(counts, iw, ic):
+    """
+    Drops the words and contexts without any pairs from a count matrix and orders the rest alphabetically.
+    This yields the same matrix and vocabularies as reading the textual counts with read_counts_matrix.
+    """
+    rows = np.flatnonzero(np.array(counts.sum(axis=1))[:, 0])
+    cols = np.flatnonzero(np.array(counts.sum(axis=0))[0, :])
+    rows = rows[np.array(sorted(xrange(len(rows)), key=lambda i: iw[rows[i]]), dtype=np.int64)]
+    cols = cols[np.array(sorted(xrange(len(cols)), key=lambda i: ic[cols[i]]), dtype=np.int64)]
+    counts = counts[rows][:, cols]
+    counts.sort_indices()
+    return counts, [iw[i] for i in rows], [ic[i] for i in cols]
+
+
+def count_samples(counts, samples, wi, win, pos=False, block_size=1000000):
+    """
+    Counts the pairs within each token's window. Samples are (tokens, windows) of each sentence, with None placeholders
+    for removed tokens; they are processed in large blocks of token ids. Positional contexts (pos) are numbered
+    context * 2 * win + slot, where slot enumerates the offsets -win, ..., -1, 1, ..., win.
+    """
+    padding = [-1] * win
+    ids = []
+    windows = []
+    for tokens, token_windows in samples:
+        ids.extend([wi[t] if t is not None else -1 for t in tokens])
+        ids.extend(padding)
+        windows.extend(token_windows)
+        windows.extend(padding)
+        if len(ids) >= block_size:
+            add_window_counts(counts, ids, windows, win, pos)
+            ids = []
+            windows = []
+    add_window_counts(counts, ids, windows, win, pos)
+
+
+def add_window_counts(counts, ids, windows, win, pos):
+    ids = np.array(ids, dtype=np.int64)
+    words, contexts = window_pairs(ids, win, np.array(windows, dtype=np.int64))
+    if pos:
+        offsets = contexts - words
+        slots = np.where(offsets < 0, offsets + win, offsets + win - 1)
+        counts.update(ids[words], ids[contexts] * 2 * win + slots)
+    else:
+        counts.update(ids[words], ids[contexts])
+
+
+def write_counts(f, counter, iw, ic, block_size=100000, lines_per_write=10000):
+    """
+    Writes the counts in the count-word-context textual format, formatting lines_per_write lines at a time.
+    """
+    for words, contexts, counts in counter.iter_items(block_size):
+        for start in xrange(0, len(counts), lines_per_write):
+            end = start + lines_per_write
+            rows = izip(counts[start:end].tolist(), words[start:end].tolist(), contexts[start:end].tolist())
+            f.write(''.join(['%d %s %s\n' % (n, iw[w], ic[c]) for n, w, c in rows]))
+
+
+def write_binary_counts(path, counter, iw, ic):
+    """
+    Saves the counts in the binary counts format. Words and contexts without any pairs are dropped and the rest are
+    renumbered alphabetically; if that changes their order, the pairs are re-sorted within the counter's memory budget.
+    """
+    sum_w = np.zeros(len(iw), dtype=np.int64)
+    sum_c = np.zeros(len(ic), dtype=np.int64)
+    nnz = 0
+    for words, contexts, counts in counter.iter_items():
+        sum_w += np.bincount(words, counts, minlength=len(iw)).astype(np.int64)
+        sum_c += np.bincount(contexts, counts, minlength=len(ic)).astype(np.int64)
+        nnz += len(counts)
+    rows = np.flatnonzero(sum_w)
+    cols = np.flatnonzero(sum_c)
+    rows = rows[np.array(sorted(xrange(len(rows)), key=lambda i: iw[rows[i]]), dtype=np.int64)]
+    cols = cols[np.array(sorted(xrange(len(cols)), key=lambda i: ic[cols[i]]), dtype=np.int64)]
+    word_ids = np.zeros(len(iw), dtype=np.int64)
+    word_ids[rows] = np.arange(len(rows))
+    context_ids = np.zeros(len(ic), dtype=np.int64)
+    context_ids[cols] = np.arange(len(cols))
+
+    renumbered = None
+    if np.all(np.diff(rows) > 0) and np.all(np.diff(cols) > 0):
+        blocks = ((word_ids[w], context_ids[c], n) for w, c, n in counter.iter_items())
+    else:
+        renumbered = CooccurrenceCounter(len(rows), len(cols), memory=counter.memory, tmp_dir=counter.tmp_dir)
+        for words, contexts, counts in counter.iter_items():
+            renumbered.update(word_ids[words], context_ids[contexts], counts)
+        blocks = renumbered.iter_items()
+    try:
+        save_binary_counts(path, blocks, nnz, [iw[i] for i in rows], sum_w[rows], [ic[i] for i in cols], sum_c[cols])
+    finally:
+        if renumbered is not None:
+            renumbered.close()
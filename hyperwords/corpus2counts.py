@@ -1,51 +1,80 @@
-from collections import Counter
-from math import sqrt
+import sys
 
 from docopt import docopt
+import numpy as np
+
+from cooccurrence import CooccurrenceCounter, compact_counts, iter_id_blocks, window_pairs, write_counts, \
+    write_binary_counts
+from corpus2pairs import read_vocab
+from representations.matrix_serializer import save_matrix, save_count_vocabulary
+from sharding import map_shards, read_shard
 
 
 def main():
     args = docopt("""
     Usage:
         corpus2counts.py [options] <corpus>
-    
+
     Options:
-        --thr NUM    The minimal word count for being in the vocabulary [default: 100]
-        --win NUM    Window size [default: 2]
+        --thr NUM        The minimal word count for being in the vocabulary [default: 100]
+        --win NUM        Window size [default: 2]
+        --csr PATH       Save the counts as a sparse matrix (CSR) with its vocabularies instead of printing them
+        --bin PATH       Save the counts in the binary counts format instead of printing them
+        --workers NUM    Number of processes, each counting the pairs of one part of the corpus [default: 1]
+        --mem NUM        Memory budget for the counts of each process in megabytes; larger counts are spilled to disk
+        --tmp DIR        Directory for the spilled counts [default: .]
+        --clean          Clean the corpus on the fly, as scripts/clean_corpus.sh does
     """)
 
     corpus_file = args['<corpus>']
     thr = int(args['--thr'])
     win = int(args['--win'])
+    csr_path = args['--csr']
+    bin_path = args['--bin']
+    workers = int(args['--workers'])
+    memory = int(args['--mem']) * 1024 * 1024 if args['--mem'] is not None else None
+    tmp_dir = args['--tmp']
+    clean = args['--clean']
+
+    vocab = read_vocab(corpus_file, thr, workers, clean)
+    iw = sorted(vocab)
+    wi = dict([(w, i) for i, w in enumerate(iw)])
+
+    counts = CooccurrenceCounter(len(iw), len(iw), memory=memory, tmp_dir=tmp_dir)
+    try:
+        for shard_counts in map_shards(count_shard_pairs, corpus_file, workers, wi, win, memory, tmp_dir, clean):
+            counts.merge(shard_counts)
+
+        if csr_path is not None:
+            save_counts_matrix(csr_path, counts.tocsr(), iw, iw)
+        elif bin_path is not None:
+            write_binary_counts(bin_path, counts, iw, iw)
+        else:
+            write_counts(sys.stdout, counts, iw, iw)
+    finally:
+        counts.close()
+
+
+def count_shard_pairs(corpus_file, start, end, index, wi, win, memory, tmp_dir, clean):
+    counts = CooccurrenceCounter(len(wi), len(wi), memory=memory, tmp_dir=tmp_dir)
+    lines = read_shard(corpus_file, start, end, clean)
+    for ids in iter_id_blocks((line.strip().split() for line in lines), wi, win):
+        words, contexts = window_pairs(ids, win)
+        counts.update(ids[words], ids[contexts])
+    counts.reduce()
+    return counts
+
 
-    vocab = read_vocab(corpus_file, thr)
-    corpus_size = sum(vocab.values())
-
-    counts = Counter()
-    with open(corpus_file) as f:
-        for line in f:
-            tokens = [t if t in vocab else None for t in line.strip().split()]
-            len_tokens = len(tokens)
-            for i, tok in enumerate(tokens):
-                if tok is not None:
-                    start = i - win
-                    if start < 0:
-                        start = 0
-                    end = i + win + 1
-                    if end > len_tokens:
-                        end = len_tokens
-                    for pair in [(tok, tokens[j]) for j in xrange(start, end) if j != i and tokens[j] is not None]:
-                        counts[pair] += 1
-    for pair, count in counts.items():
-        print(str(count)+" "+pair[0] + " " + pair[1])
-
-
-def read_vocab(corpus_file, thr):
-    vocab = Counter()
-    with open(corpus_file) as f:
-        for line in f:
-            vocab.update(Counter(line.strip().split()))
-    return dict([(token, count) for token, count in vocab.items() if count >= thr])
+def save_counts_matrix(path, counts, iw, ic):
+    """
+    Saves the counts as a sparse matrix (CSR) with its count vocabularies, omitting words and contexts without any pairs.
+    """
+    counts, iw, ic = compact_counts(counts, iw, ic)
+    sum_w = np.array(counts.sum(axis=1, dtype=np.float64))[:, 0]
+    sum_c = np.array(counts.sum(axis=0, dtype=np.float64))[0, :]
+    save_matrix(path, counts)
+    save_count_vocabulary(path + '.words.vocab', zip(iw, sum_w.astype(np.int64)))
+    save_count_vocabulary(path + '.contexts.vocab', zip(ic, sum_c.astype(np.int64)))
 
 
 if __name__ == '__main__':
@@ -1,79 +1,141 @@
-from collections import Counter
-from math import sqrt
-from random import Random
-
-from docopt import docopt
-
-
-def main():
-    args = docopt("""
-    Usage:
-        corpus2pairs.py [options] <corpus>
-    
-    Options:
-        --thr NUM    The minimal word count for being in the vocabulary [default: 100]
-        --win NUM    Window size [default: 2]
-        --pos        Positional contexts
-        --dyn        Dynamic context windows
-        --sub NUM    Subsampling threshold [default: 0]
-        --del        Delete out-of-vocabulary and subsampled placeholders
-    """)
-    
-    corpus_file = args['<corpus>']
-    thr = int(args['--thr'])
-    win = int(args['--win'])
-    pos = args['--pos']
-    dyn = args['--dyn']
-    subsample = float(args['--sub'])
-    sub = subsample != 0
-    d3l = args['--del']
-    
-    vocab = read_vocab(corpus_file, thr)
-    corpus_size = sum(vocab.values())
-    
-    subsample *= corpus_size
-    subsampler = dict([(word, 1 - sqrt(subsample / count)) for word, count in vocab.items() if count > subsample])
-    
-    rnd = Random(17)
-    with open(corpus_file) as f: 
-        for line in f:
-            
-            tokens = [t if t in vocab else None for t in line.strip().split()]
-            if sub:
-                tokens = [t if t not in subsampler or rnd.random() > subsampler[t] else None for t in tokens]
-            if d3l:
-                tokens = [t for t in tokens if t is not None]
-            
-            len_tokens = len(tokens)
-            
-            for i, tok in enumerate(tokens):
-                if tok is not None:
-                    if dyn:
-                        dynamic_window = rnd.randint(1, win)
-                    else:
-                        dynamic_window = win
-                    start = i - dynamic_window
-                    if start < 0:
-                        start = 0
-                    end = i + dynamic_window + 1
-                    if end > len_tokens:
-                        end = len_tokens
-                    
-                    if pos:
-                        output = '\n'.join([row for row in [tok + ' ' + tokens[j] + '_' + str(j - i) for j in xrange(start, end) if j != i and tokens[j] is not None] if len(row) > 0]).strip()
-                    else:
-                        output = '\n'.join([row for row in [tok + ' ' + tokens[j] for j in xrange(start, end) if j != i and tokens[j] is not None] if len(row) > 0]).strip()
-                    if len(output) > 0:
-                        print output
-
-
-def read_vocab(corpus_file, thr):
-    vocab = Counter()
-    with open(corpus_file) as f:
-        for line in f:
-            vocab.update(Counter(line.strip().split()))
-    return dict([(token, count) for token, count in vocab.items() if count >= thr])
-
-
-if __name__ == '__main__':
-    main()
+from collections import Counter
+from math import sqrt
+from random import Random
+import os
+import shutil
+import sys
+import tempfile
+
+from docopt import docopt
+
+from sharding import map_shards, read_shard, shard_seed
+
+
+def main():
+    args = docopt("""
+    Usage:
+        corpus2pairs.py [options] <corpus>
+
+    Options:
+        --thr NUM        The minimal word count for being in the vocabulary [default: 100]
+        --win NUM        Window size [default: 2]
+        --pos            Positional contexts
+        --dyn            Dynamic context windows
+        --sub NUM        Subsampling threshold [default: 0]
+        --del            Delete out-of-vocabulary and subsampled placeholders
+        --workers NUM    Number of processes, each extracting the pairs of one part of the corpus [default: 1]
+        --tmp DIR        Directory for the pairs of each process before they are concatenated [default: .]
+        --clean          Clean the corpus on the fly, as scripts/clean_corpus.sh does
+    """)
+
+    corpus_file = args['<corpus>']
+    thr = int(args['--thr'])
+    win = int(args['--win'])
+    pos = args['--pos']
+    dyn = args['--dyn']
+    subsample = float(args['--sub'])
+    d3l = args['--del']
+    workers = int(args['--workers'])
+    clean = args['--clean']
+    tmp_dir = args['--tmp']
+
+    vocab = read_vocab(corpus_file, thr, workers, clean)
+    subsampler = get_subsampler(vocab, subsample)
+
+    if workers == 1:
+        for index in map_shards(write_shard_pairs, corpus_file, 1, vocab, subsampler, win, pos, dyn, d3l, clean, None):
+            pass
+    else:
+        pairs_dir = tempfile.mkdtemp(prefix='pairs.', dir=tmp_dir)
+        try:
+            for index in map_shards(write_shard_pairs, corpus_file, workers, vocab, subsampler, win, pos, dyn, d3l,
+                                    clean, pairs_dir):
+                with open(os.path.join(pairs_dir, str(index))) as f:
+                    shutil.copyfileobj(f, sys.stdout)
+                os.remove(os.path.join(pairs_dir, str(index)))
+        finally:
+            shutil.rmtree(pairs_dir)
+
+
+def write_shard_pairs(corpus_file, start, end, index, vocab, subsampler, win, pos, dyn, d3l, clean, pairs_dir):
+    """
+    Writes the pairs of one shard to pairs_dir/index (or to stdout if pairs_dir is None), and returns index.
+    """
+    rnd = Random(shard_seed(index))
+    lines = read_shard(corpus_file, start, end, clean)
+    f = sys.stdout if pairs_dir is None else open(os.path.join(pairs_dir, str(index)), 'w')
+    try:
+        for tokens, windows in sample_windows(lines, vocab, subsampler, rnd, win, dyn, d3l):
+            write_pairs(f, tokens, windows, pos)
+    finally:
+        if pairs_dir is not None:
+            f.close()
+    return index
+
+
+def get_subsampler(vocab, subsample):
+    """
+    Maps each frequent word to its probability of being subsampled (empty if subsampling is off).
+    """
+    if subsample == 0:
+        return {}
+    subsample *= sum(vocab.values())
+    return dict([(word, 1 - sqrt(subsample / count)) for word, count in vocab.items() if count > subsample])
+
+
+def sample_windows(lines, vocab, subsampler, rnd, win, dyn, d3l):
+    """
+    Yields the tokens of each line, with None placeholders for out-of-vocabulary and subsampled words,
+    and the window size of every token (0 for placeholders).
+    Random numbers are drawn token by token, so a fixed seed always reproduces the same pairs.
+    """
+    for line in lines:
+        tokens = [t if t in vocab else None for t in line.strip().split()]
+        if subsampler:
+            tokens = [t if t not in subsampler or rnd.random() > subsampler[t] else None for t in tokens]
+        if d3l:
+            tokens = [t for t in tokens if t is not None]
+
+        if dyn:
+            windows = [rnd.randint(1, win) if t is not None else 0 for t in tokens]
+        else:
+            windows = [win if t is not None else 0 for t in tokens]
+        yield tokens, windows
+
+
+def write_pairs(f, tokens, windows, pos):
+    len_tokens = len(tokens)
+
+    for i, tok in enumerate(tokens):
+        if tok is not None:
+            start = i - windows[i]
+            if start < 0:
+                start = 0
+            end = i + windows[i] + 1
+            if end > len_tokens:
+                end = len_tokens
+
+            if pos:
+                output = '\n'.join([row for row in [tok + ' ' + tokens[j] + '_' + str(j - i) for j in xrange(start, end) if j != i and tokens[j] is not None] if len(row) > 0]).strip()
+            else:
+                output = '\n'.join([row for row in [tok + ' ' + tokens[j] for j in xrange(start, end) if j != i and tokens[j] is not None] if len(row) > 0]).strip()
+            if len(output) > 0:
+                print >>f, output
+
+
+def read_vocab(corpus_file, thr, workers=1, clean=False):
+    vocab = Counter()
+    for shard_vocab in map_shards(count_shard_tokens, corpus_file, workers, clean):
+        vocab.update(shard_vocab)
+    return dict([(token, count) for token, count in vocab.items() if count >= thr])
+
+
+def count_shard_tokens(corpus_file, start, end, index, clean):
+    vocab = Counter()
+    for line in read_shard(corpus_file, start, end, clean):
+        vocab.update(Counter(line.strip().split()))
+    return vocab
+
+
+if __name__ == '__main__':
+    main()
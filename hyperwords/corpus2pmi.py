@@ -0,0 +1,150 @@
+from collections import Counter
+from random import Random
+import os
+import shutil
+
+from docopt import docopt
+import numpy as np
+
+from cooccurrence import CooccurrenceCounter, compact_counts, count_samples, write_counts, write_binary_counts
+from corpus2pairs import read_vocab, get_subsampler, sample_windows, write_pairs
+from counts2pmi import calc_pmi
+from representations.matrix_serializer import save_matrix, save_vocabulary, save_count_vocabulary
+from sharding import map_shards, read_shard, shard_seed
+
+
+def main():
+    args = docopt("""
+    Usage:
+        corpus2pmi.py [options] <corpus> <output_path>
+
+    Options:
+        --thr NUM       The minimal word count for being in the vocabulary [default: 100]
+        --win NUM       Window size [default: 2]
+        --pos           Positional contexts
+        --dyn           Dynamic context windows
+        --sub NUM       Subsampling threshold [default: 0]
+        --del           Delete out-of-vocabulary and subsampled placeholders
+        --cds NUM       Context distribution smoothing [default: 1.0]
+        --pairs PATH    Also write the word-context pairs (as corpus2pairs.py) to PATH
+        --counts PATH   Also write the counts and their vocabularies (as pairs2counts.sh and counts2vocab.py) to PATH
+        --bin PATH      Also write the counts in the binary counts format to PATH
+        --workers NUM   Number of processes, each counting the pairs of one part of the corpus [default: 1]
+        --clean         Clean the corpus on the fly, as scripts/clean_corpus.sh does
+    """)
+
+    corpus_file = args['<corpus>']
+    vectors_path = args['<output_path>']
+    thr = int(args['--thr'])
+    win = int(args['--win'])
+    pos = args['--pos']
+    dyn = args['--dyn']
+    subsample = float(args['--sub'])
+    d3l = args['--del']
+    cds = float(args['--cds'])
+    pairs_path = args['--pairs']
+    counts_path = args['--counts']
+    bin_path = args['--bin']
+    workers = int(args['--workers'])
+    clean = args['--clean']
+
+    vocab = read_vocab(corpus_file, thr, workers, clean)
+    subsampler = get_subsampler(vocab, subsample)
+    iw = sorted(vocab)
+    wi = dict([(w, i) for i, w in enumerate(iw)])
+    if pos:
+        ic = PositionalContexts(iw, win)
+    else:
+        ic = iw
+
+    counts = CooccurrenceCounter(len(iw), len(ic))
+    for shard_counts in map_shards(count_shard_pairs, corpus_file, workers, vocab, subsampler, wi, len(ic), win, pos,
+                                   dyn, d3l, clean, pairs_path, workers > 1):
+        counts.merge(shard_counts)
+    if pairs_path is not None and workers > 1:
+        merge_shard_files(pairs_path, workers)
+
+    if counts_path is not None:
+        save_counts(counts_path, counts, iw, ic)
+    if bin_path is not None:
+        write_binary_counts(bin_path, counts, iw, ic)
+
+    counts, iw, ic = compact_counts(counts.tocsr(), iw, ic)
+    pmi = calc_pmi(counts, cds)
+
+    save_matrix(vectors_path, pmi)
+    save_vocabulary(vectors_path + '.words.vocab', iw)
+    save_vocabulary(vectors_path + '.contexts.vocab', ic)
+
+
+class PositionalContexts:
+    """
+    The vocabulary of positional contexts (word_offset). Context i is word i // (2 * win) at the (i % (2 * win))-th
+    offset of -win, ..., -1, 1, ..., win.
+    """
+
+    def __init__(self, iw, win):
+        self.iw = iw
+        self.win = win
+
+    def __len__(self):
+        return 2 * self.win * len(self.iw)
+
+    def __getitem__(self, i):
+        w, slot = divmod(i, 2 * self.win)
+        offset = slot - self.win if slot < self.win else slot - self.win + 1
+        return self.iw[w] + '_' + str(offset)
+
+
+def count_shard_pairs(corpus_file, start, end, index, vocab, subsampler, wi, num_contexts, win, pos, dyn, d3l, clean,
+                      pairs_path, sharded):
+    """
+    Counts the pairs of one shard. Its pairs are written to pairs_path (or to pairs_path.index if sharded).
+    """
+    counts = CooccurrenceCounter(len(wi), num_contexts)
+    rnd = Random(shard_seed(index))
+    samples = sample_windows(read_shard(corpus_file, start, end, clean), vocab, subsampler, rnd, win, dyn, d3l)
+    if pairs_path is None:
+        count_samples(counts, samples, wi, win, pos)
+    else:
+        with open(pairs_path + '.' + str(index) if sharded else pairs_path, 'w') as pairs_file:
+            count_samples(counts, tee_pairs(samples, pairs_file, pos), wi, win, pos)
+    counts.reduce()
+    return counts
+
+
+def tee_pairs(samples, f, pos):
+    for tokens, windows in samples:
+        write_pairs(f, tokens, windows, pos)
+        yield tokens, windows
+
+
+def merge_shard_files(path, num_shards):
+    """
+    Concatenates path.0, path.1, ... into path and removes them.
+    """
+    with open(path, 'w') as f:
+        for i in xrange(num_shards):
+            shard_path = path + '.' + str(i)
+            with open(shard_path) as shard_file:
+                shutil.copyfileobj(shard_file, f)
+            os.remove(shard_path)
+
+
+def save_counts(path, counts, iw, ic):
+    """
+    Writes the textual counts and their count vocabularies, sorted by frequency.
+    """
+    with open(path, 'w') as f:
+        write_counts(f, counts, iw, ic)
+    words, contexts, pair_counts = counts.items()
+    sum_w = np.bincount(words, pair_counts, minlength=len(iw))
+    sum_c = np.bincount(contexts, pair_counts, minlength=len(ic))
+    word_counts = Counter(dict([(iw[i], int(sum_w[i])) for i in np.flatnonzero(sum_w)]))
+    context_counts = Counter(dict([(ic[i], int(sum_c[i])) for i in np.flatnonzero(sum_c)]))
+    save_count_vocabulary(path + '.words.vocab', word_counts.most_common())
+    save_count_vocabulary(path + '.contexts.vocab', context_counts.most_common())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+from distutils.spawn import find_executable
+import bz2
+import gzip
+import io
+import os
+import re
+import subprocess
+
+
+DECOMPRESSORS = {'.gz': ['gzip', '-dc'], '.bz2': ['bzip2', '-dc'], '.xz': ['xz', '-dc']}
+
+
+def is_compressed(path):
+    return os.path.splitext(path)[1] in DECOMPRESSORS
+
+
+def open_corpus(path):
+    """
+    Opens a corpus for reading its lines, decompressing .gz, .bz2, and .xz files on the fly. Decompression runs in a
+    helper process (gzip, bzip2, or xz), in parallel with the reader; gzip and bzip2 fall back to Python's own
+    modules if the program is missing.
+    """
+    extension = os.path.splitext(path)[1]
+    if extension not in DECOMPRESSORS:
+        return open(path)
+    command = DECOMPRESSORS[extension]
+    if find_executable(command[0]) is not None:
+        return DecompressorPipe(command + [path])
+    elif extension == '.gz':
+        # GzipFile's own readline is slow; a buffered reader over it is not.
+        return io.BufferedReader(gzip.open(path, 'rb'), 1024 * 1024)
+    elif extension == '.bz2':
+        return bz2.BZ2File(path)
+    raise Exception('Reading %s requires %s' % (path, command[0]))
+
+
+class DecompressorPipe:
+    """
+    The output of a decompression program, as a file of lines. Closing it before the end stops the program; closing it
+    at the end checks that the program succeeded.
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=1024 * 1024)
+        self.eof = False
+
+    def __iter__(self):
+        for line in self.process.stdout:
+            yield line
+        self.eof = True
+
+    def read(self, size):
+        data = self.process.stdout.read(size)
+        if len(data) == 0:
+            self.eof = True
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.process.stdout.close()
+        if not self.eof:
+            self.process.terminate()
+            self.process.wait()
+        elif self.process.wait() != 0:
+            raise Exception('%s failed (exit code %d)' % (' '.join(self.command), self.process.returncode))
+
+
+def read_corpus(path, clean=False):
+    """
+    Yields the lines of a (possibly compressed) corpus, cleaned as by scripts/clean_corpus.sh if clean is set.
+    """
+    with open_corpus(path) as f:
+        for line in f:
+            yield clean_line(line) if clean else line
+
+
+SEPARATOR = re.compile(r'[^a-z0-9]*[ \t\n\r][^a-z0-9]*')
+TRAILING = re.compile(r'[^a-z0-9]*$')
+SPACES = re.compile(r'  *')
+
+
+def clean_line(line):
+    """
+    The line as scripts/clean_corpus.sh outputs it: ASCII only (other characters and invalid UTF-8 are dropped),
+    lowercased, with every whitespace character and the non-alphanumeric characters around it replaced by a space,
+    and the non-alphanumeric characters at its end by a space, and then runs of spaces squeezed.
+    """
+    newline = line.endswith('\n')
+    if newline:
+        line = line[:-1]
+    line = line.decode('utf-8', 'ignore').encode('ascii', 'ignore').lower()
+    line = SPACES.sub(' ', TRAILING.sub(' ', SEPARATOR.sub(' ', line), 1))
+    return line + '\n' if newline else line
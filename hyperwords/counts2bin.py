@@ -0,0 +1,38 @@
+from docopt import docopt
+import numpy as np
+
+from cooccurrence import reduce_keys
+from representations.matrix_serializer import iter_counts_chunks, parse_counts, save_binary_counts
+
+
+def main():
+    args = docopt("""
+    Usage:
+        counts2bin.py <counts> <output_path>
+    """)
+
+    counts_path = args['<counts>']
+    output_path = args['<output_path>']
+
+    words = set()
+    contexts = set()
+    for counts, chunk_words, chunk_contexts in iter_counts_chunks(counts_path):
+        words.update(chunk_words)
+        contexts.update(chunk_contexts)
+    iw = sorted(words)
+    ic = sorted(contexts)
+    wi = dict([(w, i) for i, w in enumerate(iw)])
+    ci = dict([(c, i) for i, c in enumerate(ic)])
+
+    rows, cols, counts = parse_counts(counts_path, wi, ci)
+    keys, counts = reduce_keys(rows.astype(np.int64) * len(ic) + cols, counts)
+    rows = keys // len(ic)
+    cols = keys % len(ic)
+    sum_w = np.bincount(rows, counts, minlength=len(iw)).astype(np.int64)
+    sum_c = np.bincount(cols, counts, minlength=len(ic)).astype(np.int64)
+
+    save_binary_counts(output_path, [(rows, cols, counts)], len(counts), iw, sum_w, ic, sum_c)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,94 +1,127 @@
-from docopt import docopt
-from scipy.sparse import dok_matrix, csr_matrix
-import numpy as np
-
-from representations.matrix_serializer import save_matrix, save_vocabulary, load_count_vocabulary
-
-
-def main():
-    args = docopt("""
-    Usage:
-        counts2pmi.py [options] <counts> <output_path>
-    
-    Options:
-        --cds NUM    Context distribution smoothing [default: 1.0]
-    """)
-    
-    counts_path = args['<counts>']
-    vectors_path = args['<output_path>']
-    cds = float(args['--cds'])
-    
-    counts, iw, ic = read_counts_matrix(counts_path)
-
-    pmi = calc_pmi(counts, cds)
-
-    save_matrix(vectors_path, pmi)
-    save_vocabulary(vectors_path + '.words.vocab', iw)
-    save_vocabulary(vectors_path + '.contexts.vocab', ic)
-
-
-def read_counts_matrix(counts_path):
-    """
-    Reads the counts into a sparse matrix (CSR) from the count-word-context textual format.
-    """
-    words = load_count_vocabulary(counts_path + '.words.vocab')
-    contexts = load_count_vocabulary(counts_path + '.contexts.vocab')
-    words = list(words.keys())
-    contexts = list(contexts.keys())
-    iw = sorted(words)
-    ic = sorted(contexts)
-    wi = dict([(w, i) for i, w in enumerate(iw)])
-    ci = dict([(c, i) for i, c in enumerate(ic)])
-    
-    counts = csr_matrix((len(wi), len(ci)), dtype=np.float32)
-    tmp_counts = dok_matrix((len(wi), len(ci)), dtype=np.float32)
-    update_threshold = 100000
-    i = 0
-    with open(counts_path) as f:
-        for line in f:
-            count, word, context = line.strip().split()
-            if word in wi and context in ci:
-                tmp_counts[wi[word], ci[context]] = int(count)
-            i += 1
-            if i == update_threshold:
-                counts = counts + tmp_counts.tocsr()
-                tmp_counts = dok_matrix((len(wi), len(ci)), dtype=np.float32)
-                i = 0
-    counts = counts + tmp_counts.tocsr()
-    
-    return counts, iw, ic
-
-
-def calc_pmi(counts, cds):
-    """
-    Calculates e^PMI; PMI without the log().
-    """
-    sum_w = np.array(counts.sum(axis=1))[:, 0]
-    sum_c = np.array(counts.sum(axis=0))[0, :]
-    if cds != 1:
-        sum_c = sum_c ** cds
-    sum_total = sum_c.sum()
-    sum_w = np.reciprocal(sum_w)
-    sum_c = np.reciprocal(sum_c)
-    
-    pmi = csr_matrix(counts)
-    pmi = multiply_by_rows(pmi, sum_w)
-    pmi = multiply_by_columns(pmi, sum_c)
-    pmi = pmi * sum_total
-    return pmi
-
-
-def multiply_by_rows(matrix, row_coefs):
-    normalizer = dok_matrix((len(row_coefs), len(row_coefs)))
-    normalizer.setdiag(row_coefs)
-    return normalizer.tocsr().dot(matrix)
-
-
-def multiply_by_columns(matrix, col_coefs):
-    normalizer = dok_matrix((len(col_coefs), len(col_coefs)))
-    normalizer.setdiag(col_coefs)
-    return matrix.dot(normalizer.tocsr())
-
-
-if __name__ == '__main__':
-    main()
+from docopt import docopt
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from representations.matrix_serializer import save_matrix, save_vocabulary, read_counts_matrix, is_binary_counts, \
+    load_binary_counts, row_pointers, save_sharded_matrix
+
+
+def main():
+    args = docopt("""
+    Usage:
+        counts2pmi.py [options] <counts> <output_path>
+    
+    Options:
+        --cds NUM    Context distribution smoothing [default: 1.0]
+        --verbose    Report progress while reading the counts
+        --inplace    Overwrite the counts (in single precision) instead of copying them, to halve peak memory
+        --rows NUM   Stream binary counts in blocks of NUM rows and save the PMI matrix in shards (out of core)
+    """)
+    
+    counts_path = args['<counts>']
+    vectors_path = args['<output_path>']
+    cds = float(args['--cds'])
+    
+    if args['--rows'] is not None:
+        if not is_binary_counts(counts_path):
+            raise Exception('Streaming PMI (--rows) requires binary counts; see counts2bin.py.')
+        iw, ic = stream_pmi(counts_path, vectors_path, cds, int(args['--rows']))
+    else:
+        counts, iw, ic = read_counts_matrix(counts_path, verbose=args['--verbose'])
+        pmi = calc_pmi(counts, cds, args['--inplace'])
+        save_matrix(vectors_path, pmi)
+
+    save_vocabulary(vectors_path + '.words.vocab', iw)
+    save_vocabulary(vectors_path + '.contexts.vocab', ic)
+
+
+def calc_pmi(counts, cds, inplace=False, block_size=1000000):
+    """
+    Calculates e^PMI; PMI without the log().
+    Rows and columns are scaled directly on the data of a CSR matrix, one block of rows at a time. Unless inplace, the
+    counts are first copied to double precision; otherwise they are overwritten with the PMI values.
+    """
+    sum_w = np.array(counts.sum(axis=1))[:, 0]
+    sum_c = np.array(counts.sum(axis=0))[0, :]
+    if cds != 1:
+        sum_c = sum_c ** cds
+    sum_total = sum_c.sum()
+    sum_w = np.reciprocal(sum_w)
+    sum_c = np.reciprocal(sum_c)
+    
+    pmi = counts if inplace else counts.astype(np.float64)
+    multiply_by_rows(pmi, sum_w, True, block_size)
+    multiply_by_columns(pmi, sum_c, True, block_size)
+    pmi.data *= sum_total
+    return pmi
+
+
+def stream_pmi(counts_path, vectors_path, cds, block_rows):
+    """
+    Calculates e^PMI from binary counts one block of rows at a time, and saves each block as a shard.
+    The marginals (and the cds smoothing of sum_c) come from the word and context counts stored with the binary counts,
+    so only one block of the (memory-mapped) counts is ever in memory.
+    """
+    rows, cols, counts, iw, sum_w, ic, sum_c = load_binary_counts(counts_path)
+    sum_c = sum_c.astype(np.float64)
+    if cds != 1:
+        sum_c = sum_c ** cds
+    sum_total = sum_c.sum()
+    sum_w = np.reciprocal(sum_w.astype(np.float64))
+    sum_c = np.reciprocal(sum_c)
+    indptr = row_pointers(rows, len(iw))
+
+    def blocks():
+        for start in xrange(0, len(iw), block_rows):
+            end = min(start + block_rows, len(iw))
+            lo, hi = indptr[start], indptr[end]
+            block = csr_matrix((counts[lo:hi].astype(np.float64), np.array(cols[lo:hi]), indptr[start:end + 1] - lo),
+                               shape=(end - start, len(ic)))
+            multiply_by_rows(block, sum_w[start:end], True)
+            multiply_by_columns(block, sum_c, True)
+            block.data *= sum_total
+            yield block
+
+    save_sharded_matrix(vectors_path, blocks(), (len(iw), len(ic)))
+    return iw, ic
+
+
+def multiply_by_rows(matrix, row_coefs, inplace=False, block_size=1000000):
+    """
+    Multiplies each row of a CSR matrix by its coefficient, repeating the coefficients along indptr.
+    """
+    if not inplace:
+        matrix = matrix.astype(np.float64)
+    for start, end in row_blocks(matrix.indptr, block_size):
+        data = matrix.data[matrix.indptr[start]:matrix.indptr[end]]
+        data *= np.repeat(row_coefs[start:end], np.diff(matrix.indptr[start:end + 1]))
+    return matrix
+
+
+def multiply_by_columns(matrix, col_coefs, inplace=False, block_size=1000000):
+    """
+    Multiplies each column of a CSR matrix by its coefficient, gathering the coefficients along indices.
+    """
+    if not inplace:
+        matrix = matrix.astype(np.float64)
+    for start, end in row_blocks(matrix.indptr, block_size):
+        data = matrix.data[matrix.indptr[start]:matrix.indptr[end]]
+        data *= col_coefs[matrix.indices[matrix.indptr[start]:matrix.indptr[end]]]
+    return matrix
+
+
+def row_blocks(indptr, block_size):
+    """
+    Splits the rows of a CSR matrix into consecutive blocks of at most block_size nonzeros (or a single row).
+    """
+    num_rows = len(indptr) - 1
+    start = 0
+    while start < num_rows:
+        end = np.searchsorted(indptr, indptr[start] + block_size, side='right') - 1
+        end = min(max(end, start + 1), num_rows)
+        yield start, end
+        start = end
+
+
+if __name__ == '__main__':
+    main()
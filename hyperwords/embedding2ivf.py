@@ -0,0 +1,35 @@
+from docopt import docopt
+
+from representations.ann_index import build_ivf_index
+from representations.representation_factory import build_representation, maps_as_is
+
+
+def main():
+    args = docopt("""
+    Usage:
+        embedding2ivf.py [options] <representation> <representation_path> <index_path>
+    
+    Options:
+        --w+c           Use ensemble of word and context vectors
+        --eig NUM       Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
+        --lists NUM     Number of inverted lists (k-means clusters), at most the sample size [default: 1024]
+        --iter NUM      Number of k-means iterations [default: 10]
+        --sample NUM    Number of vectors to train k-means on [default: 100000]
+    """)
+    
+    rep_type = args['<representation>']
+    path = args['<representation_path>']
+    index_path = args['<index_path>']
+    w_c = args['--w+c']
+    eig = float(args['--eig'])
+    
+    if rep_type == 'PPMI':
+        raise Exception('PPMI is not a dense embedding.')
+    # Map the vectors only if they are used as they are saved (otherwise mapping them would not save the copy).
+    embedding = build_representation(rep_type, path, 1, w_c, eig, maps_as_is(rep_type, path, w_c))
+    build_ivf_index(index_path, embedding.m, embedding.iw, int(args['--lists']), int(args['--iter']),
+                    int(args['--sample']))
+
+
+if __name__ == '__main__':
+    main()
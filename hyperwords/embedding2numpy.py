@@ -0,0 +1,40 @@
+from docopt import docopt
+
+from representations.embedding import Embedding, EnsembleEmbedding, SVDEmbedding
+from representations.matrix_serializer import save_embedding
+
+
+def main():
+    args = docopt("""
+    Usage:
+        embedding2numpy.py [options] <representation> <representation_path> <output_path>
+    
+    Options:
+        --w+c        Use ensemble of word and context vectors
+        --eig NUM    Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
+    """)
+    
+    rep_type = args['<representation>']
+    path = args['<representation_path>']
+    output_path = args['<output_path>']
+    w_c = args['--w+c']
+    eig = float(args['--eig'])
+    
+    if rep_type == 'PPMI':
+        raise Exception('PPMI is not a dense embedding.')
+    elif rep_type == 'SVD':
+        if w_c:
+            embedding = EnsembleEmbedding(SVDEmbedding(path, False, eig, False), SVDEmbedding(path, False, eig, True), True)
+        else:
+            embedding = SVDEmbedding(path, True, eig)
+    else:
+        if w_c:
+            embedding = EnsembleEmbedding(Embedding(path + '.words', False), Embedding(path + '.contexts', False), True)
+        else:
+            embedding = Embedding(path + '.words', True)
+    
+    save_embedding(output_path + '.words', embedding.m, embedding.iw, normalized=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import csv
+import json
+from multiprocessing import Pool
+import resource
+import sys
+import time
+
+from docopt import docopt
+
+import analogy_eval
+import ws_eval
+from representations.representation_factory import create_representation
+
+
+def main():
+    args = docopt("""
+    Usage:
+        eval_harness.py [options] <manifest>
+
+    Options:
+        --workers NUM   Number of processes; each loads one representation at a time [default: 1]
+        --format FMT    Output format: csv or json (one object per line) [default: csv]
+        --mmap          Memory-map the embeddings instead of reading them (not applicable to PPMI)
+        --cache DIR     Cache the built representations in DIR (e.g. ~/.cache/hyperwords), for later runs to reuse
+        --cache-mb NUM  Size limit of the cache in megabytes; least recently used entries are evicted [default: 4096]
+    """)
+
+    with open(args['<manifest>']) as f:
+        manifest = json.load(f)
+    workers = int(args['--workers'])
+    options = dict([(option, args[option]) for option in ['--mmap', '--cache', '--cache-mb']])
+    tasks = [(representation, manifest.get('ws', []), manifest.get('analogy', []), options)
+             for representation in manifest['representations']]
+
+    writer = ResultWriter(sys.stdout, args['--format'])
+    # A fresh process per representation (even with one worker), so that its peak memory is measured alone.
+    pool = Pool(workers, maxtasksperchild=1)
+    try:
+        for rows in pool.imap_unordered(evaluate_representation, tasks):
+            writer.write(rows)
+    finally:
+        pool.close()
+        pool.join()
+
+
+FIELDS = ['representation', 'path', 'neg', 'eig', 'w+c', 'testset', 'metric', 'value', 'seconds', 'load_seconds',
+          'peak_mb']
+
+
+def evaluate_representation(task):
+    """
+    Loads one representation of the manifest and evaluates it on all the testsets.
+    Returns a row (see FIELDS) per testset and metric.
+    """
+    representation, ws_paths, analogy_paths, options = task
+    rep_type = representation['type']
+    path = representation['path']
+    neg = int(representation.get('neg', 1))
+    eig = float(representation.get('eig', 0.5))
+    w_c = bool(representation.get('w+c', False))
+    args = {'<representation>': rep_type, '<representation_path>': path, '--neg': str(neg), '--eig': str(eig),
+            '--w+c': w_c}
+    args.update(options)
+
+    start = time.time()
+    loaded = create_representation(args)
+    load_seconds = time.time() - start
+
+    results = []
+    for ws_path in ws_paths:
+        start = time.time()
+        correlation = ws_eval.evaluate(loaded, ws_eval.read_test_set(ws_path))
+        results.append((ws_path, [('spearman', correlation)], time.time() - start))
+    for analogy_path in analogy_paths:
+        start = time.time()
+        accuracy_add, accuracy_mul = analogy_eval.evaluate(loaded, analogy_eval.read_test_set(analogy_path))
+        results.append((analogy_path, [('3CosAdd', accuracy_add), ('3CosMul', accuracy_mul)], time.time() - start))
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    rows = []
+    for testset, scores, seconds in results:
+        for metric, value in scores:
+            rows.append(dict(zip(FIELDS, [rep_type, path, neg, eig, w_c, testset, metric, float(value),
+                                          round(seconds, 3), round(load_seconds, 3), round(peak_mb, 1)])))
+    return rows
+
+
+class ResultWriter:
+    """
+    Writes rows of results as CSV (with a header) or as JSON lines, flushing after every batch.
+    """
+
+    def __init__(self, f, output_format):
+        if output_format not in ['csv', 'json']:
+            raise Exception('Unknown output format: ' + output_format)
+        self.f = f
+        self.output_format = output_format
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(f, FIELDS)
+            self.writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.output_format == 'csv':
+                self.writer.writerow(row)
+            else:
+                print >>self.f, json.dumps(row, sort_keys=True)
+        self.f.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,32 @@
+from array import array
 import os
+import shutil
 import string
+import tempfile
 from collections import Counter
 from docopt import docopt
+from multiprocessing import Pool
 import sys
 import codecs
 
+import numpy as np
+
+from cooccurrence import CooccurrenceCounter, window_pairs, write_counts, write_binary_counts
+from corpus_reader import DECOMPRESSORS, open_corpus
+
 def main():
     args = docopt("""
     Usage:
         google_books_parts2counts.py [options] <path> <outpath> <start> <end>
-    
+
     Options:
-        --thr NUM    The minimal word count for being in the vocabulary [default: 100]
-        --win NUM    Window size [default: 2]
-        --step NUM   Time step between start and end [default: 10]
+        --thr NUM      The minimal word count for being in the vocabulary [default: 100]
+        --win NUM      Window size [default: 2]
+        --step NUM     Time step between start and end [default: 10]
         --lowercase
+        --workers NUM  Number of processes, each counting one time slice at a time [default: 1]
+        --cache DIR    Directory of the parsed year files, which are reused by later runs [default: <outpath>/years]
+        --bin          Save the counts of each slice in the binary counts format instead of the textual one
     """)
 
     path = args['<path>']
@@ -23,59 +35,181 @@ def main():
     win = int(args['--win'])
     start = int(args['<start>'])
     end = int(args['<end>']) + 1
-    step = int(args['--step'])  
+    step = int(args['--step'])
     lowercase=args['--lowercase']
+    workers = int(args['--workers'])
+    cache = args['--cache'].replace('<outpath>', outpath)
+    binary = args['--bin']
     if (end - start) % step != 0:
         raise Exception("Timespan not divisible by step!")
-    for x in range(start, end - step + 1, step):
-        print "Processing"+str(x)
-        vocab = Counter()
-        for y in range(x, x + step, 1):
-            add_vocab(vocab,os.path.join(path, str(y)),lowercase)
-        vocab = dict([(token, count) for token, count in vocab.items() if count >= thr])
-        counts = Counter()
-        for y in range(x, x + step, 1):
-            add_counts(counts,os.path.join(path, str(y)),vocab,win,lowercase)
-        outdir = os.path.join(outpath,str(x))
-        if not os.path.exists(outdir):
-            os.makedirs(outdir)
-        store_counts(counts,os.path.join(outdir, "counts"))
-
-def store_counts(counts, outfile):
+    tasks = [(path, outpath, cache, x, step, thr, win, lowercase, binary) for x in range(start, end - step + 1, step)]
+    if workers == 1:
+        for task in tasks:
+            count_slice(task)
+        return
+    pool = Pool(workers)
+    try:
+        pool.map(count_slice, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def count_slice(task):
+    """
+    Counts the pairs of the years x, ..., x + step - 1 into outpath/x/counts. Every year file is parsed once (see
+    parse_year); the slice's vocabulary is the sum of the years' token frequencies, and the counts are then computed
+    from the years' cached n-grams.
+    """
+    path, outpath, cache, x, step, thr, win, lowercase, binary = task
+    print "Processing"+str(x)
+    sys.stdout.flush()
+    years = [load_year(cache, year_file(path, y), lowercase) for y in range(x, x + step, 1)]
+    vocab = Counter()
+    for frequencies, year_iw, directory in years:
+        vocab.update(frequencies)
+    iw = sorted(token for token, count in vocab.items() if count >= thr)
+    wi = dict([(w, i) for i, w in enumerate(iw)])
+    counts = CooccurrenceCounter(len(iw), len(iw))
+    for frequencies, year_iw, directory in years:
+        add_counts(counts, directory, year_iw, wi, win)
+    outdir = os.path.join(outpath,str(x))
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+    if binary:
+        write_binary_counts(os.path.join(outdir, "counts"), counts, iw, iw)
+    else:
+        store_counts(counts,iw,os.path.join(outdir, "counts"))
+
+def year_file(path, y):
+    """
+    The file of year y under path, possibly compressed (e.g. y.gz).
+    """
+    corpus_file = os.path.join(path, str(y))
+    if not os.path.exists(corpus_file):
+        for extension in sorted(DECOMPRESSORS):
+            if os.path.exists(corpus_file + extension):
+                return corpus_file + extension
+    return corpus_file
+
+def store_counts(counts, iw, outfile):
     with codecs.open(outfile, "w", encoding="utf-8") as target_file:
-        for pair, count in counts.items():
-            target_file.write(str(count)+" "+pair[0] + " " + pair[1]+"\n")
+        write_counts(target_file, counts, iw, iw)
 
-def add_counts(counts,corpus_file,vocab,win,lowercase):
-    with codecs.open(corpus_file, "r", encoding="utf-8") as f:
-        for line in f:
-            text, year, match_count, volume_count = line.split("\t")
-            if lowercase:
-                text = text.lower()
-            n = int(match_count)
-            tokens = [t if t in vocab else None for t in text.strip().split()]
-            len_tokens = len(tokens)
-            for i, tok in enumerate(tokens):
-                if tok is not None:
-                    start = i - win
-                    if start < 0:
-                        start = 0
-                    end = i + win + 1
-                    if end > len_tokens:
-                        end = len_tokens
-                    for pair in [(tok, tokens[j]) for j in xrange(start, end) if j != i and tokens[j] is not None]:
-                        counts[pair] += n
-
-def add_vocab(vocab, corpus_file, lowercase):
-    with codecs.open(corpus_file) as f:
+def load_year(cache, corpus_file, lowercase):
+    """
+    Returns the token frequencies, the n-gram vocabulary, and the cache directory of the parsed year file, parsing it
+    first unless the cache already holds it (for the same file size, modification time, and lowercasing).
+    """
+    stat = os.stat(corpus_file)
+    source = '%s %d %r lowercase=%r' % (os.path.abspath(corpus_file), stat.st_size, stat.st_mtime, lowercase)
+    directory = os.path.join(cache, os.path.basename(corpus_file) + ('.lower' if lowercase else ''))
+    if not os.path.exists(directory) or read_file(os.path.join(directory, 'source')) != source:
+        parse_year(directory, corpus_file, lowercase, source)
+    frequencies = dict([line.rsplit(' ', 1) for line in read_file(os.path.join(directory, 'frequencies')).splitlines()])
+    frequencies = dict([(token, int(count)) for token, count in frequencies.items()])
+    year_iw = read_file(os.path.join(directory, 'vocab')).splitlines()
+    return frequencies, year_iw, directory
+
+def read_file(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def parse_year(directory, corpus_file, lowercase, source):
+    """
+    Reads a year file once, and saves into directory:
+    - frequencies: the frequency (sum of match counts) of every token that is not punctuation;
+    - vocab, ids.npy, lengths.npy, weights.npy: the n-grams as ids into vocab (concatenated), their lengths, and their
+      match counts.
+    Frequencies are taken over the raw bytes, but n-grams are tokenized as UTF-8 text, and their non-ASCII tokens
+    (which can never equal a byte-string vocabulary entry) are stored as -1; this reproduces counting over a file
+    opened with codecs.open(encoding='utf-8') against a vocabulary read without decoding.
+    """
+    vocab = Counter()
+    wi = {}
+    ids = array('i')
+    lengths = array('i')
+    weights = array('l')
+    with open_corpus(corpus_file) as f:
         for line in f:
             text, year, match_count, volume_count = line.split("\t")
             if lowercase:
                 text = text.lower()
             n = int(match_count)
-            for token in text.strip().split():
+            tokens = text.strip().split()
+            for token in tokens:
                 if token not in string.punctuation:
                     vocab[token] += n
+            try:
+                text.decode('ascii')
+            except UnicodeDecodeError:
+                tokens = text.decode('utf-8')
+                if lowercase:
+                    tokens = tokens.lower()
+                tokens = [ascii_or_none(t) for t in tokens.strip().split()]
+            ids.extend([wi.setdefault(t, len(wi)) if t is not None else -1 for t in tokens])
+            lengths.append(len(tokens))
+            weights.append(n)
+
+    parent = os.path.dirname(directory) or '.'
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    staging = tempfile.mkdtemp(prefix='.staging.', dir=parent)
+    with open(os.path.join(staging, 'frequencies'), 'wb') as f:
+        f.write(''.join(['%s %d\n' % (token, count) for token, count in vocab.iteritems()]))
+    with open(os.path.join(staging, 'vocab'), 'wb') as f:
+        f.write(''.join([w + '\n' for w, i in sorted(wi.items(), key=lambda item: item[1])]))
+    np.save(os.path.join(staging, 'ids.npy'), as_numpy(ids).astype(np.int32))
+    np.save(os.path.join(staging, 'lengths.npy'), as_numpy(lengths).astype(np.int32))
+    np.save(os.path.join(staging, 'weights.npy'), as_numpy(weights).astype(np.int64))
+    with open(os.path.join(staging, 'source'), 'wb') as f:
+        f.write(source)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.rename(staging, directory)
+
+def as_numpy(a):
+    """
+    A numpy view of an array.array of integers, without iterating over it.
+    """
+    if len(a) == 0:
+        return np.zeros(0, dtype='i%d' % a.itemsize)
+    return np.frombuffer(a, dtype='i%d' % a.itemsize)
+
+def ascii_or_none(token):
+    try:
+        return token.encode('ascii')
+    except UnicodeEncodeError:
+        return None
+
+def add_counts(counts, directory, year_iw, wi, win, block_size=1000000):
+    """
+    Counts the pairs of each n-gram of a parsed year match_count times. N-grams are concatenated into large blocks of
+    token ids (separated by win placeholders), and each position carries the match count of its n-gram as a weight.
+    """
+    ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r')
+    lengths = np.load(os.path.join(directory, 'lengths.npy')).astype(np.int64)
+    weights = np.load(os.path.join(directory, 'weights.npy'))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    # The slice's id of every year id; the last entry maps -1 (non-ASCII tokens) to -1.
+    local = np.array([wi.get(w, -1) for w in year_iw] + [-1], dtype=np.int64)
+    # Where each n-gram starts (and the last one ends) once they are separated by win placeholders.
+    starts = offsets + win * np.arange(len(offsets))
+    first = 0
+    while first < len(lengths):
+        last = max(first + 1, int(np.searchsorted(starts, starts[first] + block_size, 'right')) - 1)
+        block_lengths = lengths[first:last]
+        tokens = local[ids[offsets[first]:offsets[last]]]
+        padded = np.zeros(len(tokens) + win * len(block_lengths), dtype=np.int64) - 1
+        padded[np.arange(len(tokens)) + win * np.repeat(np.arange(len(block_lengths)), block_lengths)] = tokens
+        add_block_counts(counts, padded, np.repeat(weights[first:last], block_lengths + win), win)
+        first = last
+
+def add_block_counts(counts, ids, weights, win):
+    ids = np.array(ids, dtype=np.int64)
+    words, contexts = window_pairs(ids, win)
+    counts.update(ids[words], ids[contexts], np.array(weights, dtype=np.int64)[words])
 
 if __name__ == '__main__':
     main()
@@ -1,21 +1,30 @@
 from collections import Counter
 from math import sqrt
-from random import Random
+import os
+import shutil
+import sys
+import tempfile
 
 from docopt import docopt
+import numpy as np
+
+from cooccurrence import CooccurrenceCounter, write_counts, write_binary_counts
 
 
 def main():
     args = docopt("""
     Usage:
         ngram2pairs.py [options] <corpus>
-    
+
     Options:
         --thr NUM    The minimal word count for being in the vocabulary [default: 100]
-        --win NUM    Window size [default: 4]      
+        --win NUM    Window size [default: 4]
         --dyn        Dynamic context windows
         --sub NUM    Subsampling threshold [default: 0]
         --del        Delete out-of-vocabulary and subsampled placeholders
+        --mem NUM    Memory budget for the counts in megabytes; larger counts are spilled to disk
+        --tmp DIR    Directory for the spilled counts and the parsed n-grams [default: .]
+        --bin PATH   Save the counts in the binary counts format instead of printing them
     """)
 #--pos        Positional contexts
     corpus_file = args['<corpus>']
@@ -26,64 +35,199 @@ def main():
     subsample = float(args['--sub'])
     sub = subsample != 0
     d3l = args['--del']
+    memory = int(args['--mem']) * 1024 * 1024 if args['--mem'] is not None else None
+    tmp_dir = args['--tmp']
+    bin_path = args['--bin']
+
+    ngrams_dir = tempfile.mkdtemp(prefix='ngrams.', dir=tmp_dir)
+    counts = None
+    try:
+        vocab, ngrams = read_ngrams(corpus_file, ngrams_dir)
+        vocab = dict([(token, count) for token, count in vocab.items() if count >= thr])
+        corpus_size = sum(vocab.values())
+
+        subsample *= corpus_size
+        subsampler = dict([(word, 1 - sqrt(subsample / count)) for word, count in vocab.items() if count > subsample])
+
+        iw = sorted(vocab)
+        wi = dict([(w, i) for i, w in enumerate(iw)])
+
+        rnd = np.random.RandomState(17)
+        counts = CooccurrenceCounter(len(iw), len(iw), memory=memory, tmp_dir=tmp_dir)
+        count_ngrams(counts, ngrams, wi, subsampler, rnd, win, sub, dyn, d3l)
+        if bin_path is None:
+            write_counts(sys.stdout, counts, iw, iw)
+        else:
+            write_binary_counts(bin_path, counts, iw, iw)
+    finally:
+        if counts is not None:
+            counts.close()
+        shutil.rmtree(ngrams_dir, ignore_errors=True)
 
-    vocab = read_vocab(corpus_file, thr)
-    corpus_size = sum(vocab.values())
-
-    subsample *= corpus_size
-    subsampler = dict([(word, 1 - sqrt(subsample / count)) for word, count in vocab.items() if count > subsample])
-
-    rnd = Random(17)
-    counts = Counter()
-    with open(corpus_file) as f:
-        for line in f:
-            text, year, match_count, volume_count = line.split("\t")
-            tokens_outer = text.lower().split(" ")
-            #change also belwo for normalized
-            #if self.normalized == None:
-          #          parts[self.TEXT] = parts[self.TEXT]
-            #else:
-            #        parts[self.TEXT] = [self.normalized[word].lower() if word in self.normalized else word.lower() for word in parts[self.TEXT].split(" ")]
-            
-            for i in range(int(match_count)):
-                tokens = [t if t in vocab else None for t in tokens_outer]
-                if sub:
-                    tokens = [t if t not in subsampler or rnd.random() > subsampler[t] else None for t in tokens]
-                if d3l:
-                    tokens = [t for t in tokens if t is not None]
-
-                len_tokens = len(tokens)
-
-                for i, tok in enumerate(tokens):
-                    if tok is not None:
-                        if dyn:
-                            dynamic_window = rnd.randint(1, win)
-                        else:
-                            dynamic_window = win
-                        start = i - dynamic_window
-                        if start < 0:
-                            start = 0
-                        end = i + dynamic_window + 1
-                        if end > len_tokens:
-                            end = len_tokens
-
-                        #if pos:
-                        #    output = '\n'.join([row for row in [tok + ' ' + tokens[j] + '_' + str(j - i) for j in xrange(start, end) if j != i and tokens[j] is not None] if len(row) > 0]).strip()
-                        #else:
-                        for pair in [(tok,tokens[j]) for j in xrange(start, end) if j != i and tokens[j] is not None]:
-                            counts[pair] += 1
-    for tup,c in counts.items():
-        print(str(c)+" "+tup[0]+" "+tup[1])
-        
-def read_vocab(corpus_file, thr):
+
+def read_ngrams(corpus_file, directory, chunk_size=1000000):
+    """
+    Reads the corpus once: sums the match counts of every token (the vocabulary before thresholding), and writes the
+    n-grams to directory as ids into their own vocabulary (ngram_iw), their lengths, and their match counts.
+    Returns the token counts and (ngram_iw, ids, lengths, match_counts), the arrays memory-mapped.
+    """
     vocab = Counter()
-    with open(corpus_file) as f:
-        for line in f:
-            text, year, match_count, volume_count = line.split("\t")
-            match_count = int(match_count)
-            for token in text.lower().split(" "):
-                vocab[token] += match_count
-    return dict([(token, count) for token, count in vocab.items() if count >= thr])
+    ngram_wi = {}
+    files = dict([(name, open(os.path.join(directory, name), 'wb')) for name in ['ids', 'lengths', 'match_counts']])
+    chunks = dict([(name, []) for name in files])
+    try:
+        with open(corpus_file) as f:
+            for line in f:
+                text, year, match_count, volume_count = line.split("\t")
+                tokens = text.lower().split(" ")
+                match_count = int(match_count)
+                for token in tokens:
+                    vocab[token] += match_count
+                chunks['ids'].extend([ngram_wi.setdefault(t, len(ngram_wi)) for t in tokens])
+                chunks['lengths'].append(len(tokens))
+                chunks['match_counts'].append(match_count)
+                if len(chunks['lengths']) >= chunk_size:
+                    flush_chunks(files, chunks)
+        flush_chunks(files, chunks)
+    finally:
+        for f in files.values():
+            f.close()
+
+    ngram_iw = [w for w, i in sorted(ngram_wi.items(), key=lambda item: item[1])]
+    ids, lengths, match_counts = [np.memmap(os.path.join(directory, name), dtype=dtype, mode='r')
+                                  if os.path.getsize(os.path.join(directory, name)) > 0 else np.zeros(0, dtype=dtype)
+                                  for name, dtype in [('ids', np.int32), ('lengths', np.int32),
+                                                      ('match_counts', np.int64)]]
+    return vocab, (ngram_iw, ids, lengths, match_counts)
+
+
+def flush_chunks(files, chunks):
+    np.array(chunks['ids'], dtype=np.int32).tofile(files['ids'])
+    np.array(chunks['lengths'], dtype=np.int32).tofile(files['lengths'])
+    np.array(chunks['match_counts'], dtype=np.int64).tofile(files['match_counts'])
+    for chunk in chunks.values():
+        del chunk[:]
+
+
+def count_ngrams(counts, ngrams, wi, subsampler, rnd, win, sub, dyn, d3l, block_size=1000000):
+    """
+    Counts the pairs of each n-gram as if it occurred match_count times, without replaying the occurrences: an n-gram
+    is counted once with weight match_count, and subsampling and dynamic windows draw how many of its occurrences
+    fall into each outcome (see sample_keep_patterns and window_reach). The counts follow the same distribution as
+    sampling every occurrence independently, and equal it exactly when neither is used.
+    N-grams are processed in blocks of about block_size tokens.
+    """
+    ngram_iw, ids, lengths, match_counts = ngrams
+    # The id of each n-gram token in the vocabulary; the last entry maps -1 (padding) to -1.
+    local = np.array([wi.get(w, -1) for w in ngram_iw] + [-1], dtype=np.int64)
+    keep = np.ones(len(wi) + 1)
+    for w, p in subsampler.items():
+        keep[wi[w]] = 1 - p
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+    first = 0
+    while first < len(lengths):
+        last = max(first + 1, int(np.searchsorted(offsets, offsets[first] + block_size, 'right')) - 1)
+        block_ids = local[ids[offsets[first]:offsets[last]]]
+        block_starts = offsets[first:last] - offsets[first]
+        block_lengths = np.asarray(lengths[first:last])
+        block_counts = np.asarray(match_counts[first:last])
+        samples = []
+        for length in np.unique(block_lengths):
+            rows = np.flatnonzero(block_lengths == length)
+            tokens = block_ids[block_starts[rows][:, np.newaxis] + np.arange(length)]
+            weights = block_counts[rows]
+            if sub:
+                tokens, weights = sample_keep_patterns(tokens, weights, keep, rnd)
+            samples.append((tokens, weights))
+        block_ids, block_weights = concatenate_samples(samples, win, d3l)
+        if dyn:
+            reach = window_reach(block_weights, win, rnd)
+        else:
+            reach = np.broadcast_to(block_weights[:, np.newaxis], (len(block_weights), win))
+        add_reach_counts(counts, block_ids, reach, win)
+        first = last
+
+
+def sample_keep_patterns(tokens, weights, keep, rnd):
+    """
+    Subsamples n-grams of the same length (rows of tokens, occurring weights times): draws how many occurrences of
+    each n-gram keep each subset of its tokens (a multinomial over the 2 ** length subsets, drawn as a chain of
+    binomials, one per token), and returns every (n-gram, subset) that occurs as a row of tokens, with -1 for the
+    dropped ones, and the number of its occurrences.
+    """
+    probabilities = keep[tokens]
+    patterns = weights[:, np.newaxis]
+    for t in xrange(tokens.shape[1]):
+        kept = rnd.binomial(patterns, probabilities[:, t:t + 1])
+        # Subset p keeps token t if its bit t is set.
+        patterns = np.hstack([patterns - kept, kept])
+    rows, subsets = np.nonzero(patterns)
+    kept = (subsets[:, np.newaxis] >> np.arange(tokens.shape[1])) & 1
+    return np.where(kept, tokens[rows], -1), patterns[rows, subsets]
+
+
+def concatenate_samples(samples, win, d3l):
+    """
+    Concatenates (tokens, weights) of n-grams into one array of ids, separated by win placeholders (so windows never
+    cross n-grams), and the weight of each position (0 for the placeholders). With d3l, -1 tokens are deleted first.
+    """
+    block_ids = []
+    block_weights = []
+    for tokens, weights in samples:
+        if d3l:
+            present = tokens >= 0
+            sample_lengths = present.sum(axis=1)
+            flat = tokens[present]
+        else:
+            sample_lengths = np.zeros(len(tokens), dtype=np.int64) + tokens.shape[1]
+            flat = tokens.ravel()
+        positions = np.arange(len(flat)) + win * np.repeat(np.arange(len(tokens)), sample_lengths)
+        padded = np.zeros(len(flat) + win * len(tokens), dtype=np.int64) - 1
+        padded[positions] = flat
+        padded_weights = np.zeros(len(padded), dtype=np.int64)
+        padded_weights[positions] = np.repeat(weights, sample_lengths)
+        block_ids.append(padded)
+        block_weights.append(padded_weights)
+    return np.concatenate(block_ids), np.concatenate(block_weights)
+
+
+def window_reach(weights, win, rnd):
+    """
+    Dynamic context windows: each of the weights[i] occurrences of token i draws a window size uniformly from
+    1, ..., win. Returns reach[i, d - 1], how many of them see contexts at distance d (those with a window of at
+    least d), drawn as a chain of binomials.
+    """
+    reach = np.zeros((len(weights), win), dtype=np.int64)
+    remaining = weights
+    for d in xrange(1, win + 1):
+        reach[:, d - 1] = remaining
+        remaining = remaining - rnd.binomial(remaining, 1.0 / (win - d + 1))
+    return reach
+
+
+def add_reach_counts(counts, ids, reach, win):
+    """
+    Counts each pair of in-vocabulary tokens at distance d <= win, reach[word, d - 1] times.
+    """
+    words = []
+    contexts = []
+    weights = []
+    for d in xrange(1, win + 1):
+        if d >= len(ids):
+            break
+        forward = np.flatnonzero((ids[:-d] >= 0) & (ids[d:] >= 0))
+        backward = forward + d
+        words += [ids[forward], ids[backward]]
+        contexts += [ids[backward], ids[forward]]
+        weights += [reach[forward, d - 1], reach[backward, d - 1]]
+    if len(words) == 0:
+        return
+    words = np.concatenate(words)
+    contexts = np.concatenate(contexts)
+    weights = np.concatenate(weights)
+    nonzero = weights > 0
+    counts.update(words[nonzero], contexts[nonzero], weights[nonzero])
 
 
 if __name__ == '__main__':
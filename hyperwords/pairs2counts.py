@@ -0,0 +1,80 @@
+import sys
+
+from docopt import docopt
+
+from cooccurrence import CooccurrenceCounter, write_counts, write_binary_counts
+
+
+def main():
+    args = docopt("""
+    Usage:
+        pairs2counts.py [options] <pairs>
+
+    Options:
+        --mem NUM    Memory budget in megabytes for the counts and the lines being counted (not the vocabularies);
+                     larger counts are spilled to disk [default: 1024]
+        --tmp DIR    Directory for the spilled counts [default: .]
+        --bin PATH   Save the counts in the binary counts format instead of printing them
+    """)
+
+    pairs_path = args['<pairs>']
+    memory = int(args['--mem']) * 1024 * 1024
+    tmp_dir = args['--tmp']
+    bin_path = args['--bin']
+
+    wi = {}
+    ci = {}
+    # A quarter of the budget goes to the block of lines being parsed, the rest to the counts.
+    block_size = max(1, min(1000000, memory // (4 * LINE_BYTES)))
+    counts = CooccurrenceCounter(MAX_WORDS, MAX_CONTEXTS, memory=memory - block_size * LINE_BYTES, tmp_dir=tmp_dir)
+    try:
+        with open(pairs_path) as f:
+            count_pairs(counts, f, wi, ci, block_size)
+        iw = invert(wi)
+        ic = invert(ci)
+        if bin_path is None:
+            write_counts(sys.stdout, counts, iw, ic)
+        else:
+            write_binary_counts(bin_path, counts, iw, ic)
+    finally:
+        counts.close()
+
+
+MAX_WORDS = 2 ** 31 - 1
+MAX_CONTEXTS = 2 ** 32
+# About the memory of a line of pairs while it is parsed: the line, its joined and split copies, and its ids.
+LINE_BYTES = 256
+
+
+def count_pairs(counts, lines, wi, ci, block_size=1000000):
+    """
+    Counts the word-context pairs, assigning ids to new words and contexts in order of appearance.
+    """
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == block_size:
+            add_block_counts(counts, block, wi, ci)
+            block = []
+    if block:
+        add_block_counts(counts, block, wi, ci)
+
+
+def add_block_counts(counts, lines, wi, ci):
+    tokens = ''.join(lines).split()
+    if len(tokens) != 2 * len(lines):
+        raise Exception('Every line of the pairs file must contain exactly one word and one context.')
+    words = [wi.setdefault(w, len(wi)) for w in tokens[0::2]]
+    contexts = [ci.setdefault(c, len(ci)) for c in tokens[1::2]]
+    counts.update(words, contexts)
+
+
+def invert(vocab):
+    iv = [None] * len(vocab)
+    for v, i in vocab.iteritems():
+        iv[i] = v
+    return iv
+
+
+if __name__ == '__main__':
+    main()
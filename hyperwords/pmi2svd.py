@@ -1,37 +1,49 @@
-from sparsesvd import sparsesvd
-
-from docopt import docopt
-import numpy as np
-
-from representations.explicit import PositiveExplicit
-from representations.matrix_serializer import save_vocabulary
-
-
-def main():
-    args = docopt("""
-    Usage:
-        pmi2svd.py [options] <pmi_path> <output_path>
-    
-    Options:
-        --dim NUM    Dimensionality of eigenvectors [default: 500]
-        --neg NUM    Number of negative samples; subtracts its log from PMI [default: 1]
-    """)
-    
-    pmi_path = args['<pmi_path>']
-    output_path = args['<output_path>']
-    dim = int(args['--dim'])
-    neg = int(args['--neg'])
-    
-    explicit = PositiveExplicit(pmi_path, normalize=False, neg=neg)
-
-    ut, s, vt = sparsesvd(explicit.m.tocsc(), dim)
-
-    np.save(output_path + '.ut.npy', ut)
-    np.save(output_path + '.s.npy', s)
-    np.save(output_path + '.vt.npy', vt)
-    save_vocabulary(output_path + '.words.vocab', explicit.iw)
-    save_vocabulary(output_path + '.contexts.vocab', explicit.ic)
-
-
-if __name__ == '__main__':
-    main()
+from docopt import docopt
+import numpy as np
+
+from representations.explicit import PositiveExplicit
+from representations.matrix_serializer import save_vocabulary, is_sharded_matrix
+from truncated_svd import truncated_svd
+
+
+def main():
+    args = docopt("""
+    Usage:
+        pmi2svd.py [options] <pmi_path> <output_path>
+    
+    Options:
+        --dim NUM          Dimensionality of eigenvectors [default: 500]
+        --neg NUM          Number of negative samples; subtracts its log from PMI [default: 1]
+        --solver NAME      SVD solver: sparsesvd, arpack, or randomized [default: sparsesvd]
+        --oversample NUM   Extra random directions of the randomized solver [default: 10]
+        --power NUM        Power iterations of the randomized solver [default: 2]
+        --stream           Read a sharded PMI matrix one block of rows at a time (requires the randomized solver)
+    """)
+    
+    pmi_path = args['<pmi_path>']
+    output_path = args['<output_path>']
+    dim = int(args['--dim'])
+    neg = int(args['--neg'])
+    solver = args['--solver']
+    oversample = int(args['--oversample'])
+    power_iters = int(args['--power'])
+    stream = args['--stream']
+    
+    if stream:
+        if solver != 'randomized':
+            raise Exception('Streaming SVD (--stream) requires the randomized solver.')
+        if not is_sharded_matrix(pmi_path):
+            raise Exception('Streaming SVD (--stream) requires a sharded PMI matrix; see counts2pmi.py --rows.')
+    explicit = PositiveExplicit(pmi_path, normalize=False, neg=neg, lazy=stream)
+
+    ut, s, vt = truncated_svd(explicit.m, dim, solver, oversample, power_iters)
+
+    np.save(output_path + '.ut.npy', ut)
+    np.save(output_path + '.s.npy', s)
+    np.save(output_path + '.vt.npy', vt)
+    save_vocabulary(output_path + '.words.vocab', explicit.iw)
+    save_vocabulary(output_path + '.contexts.vocab', explicit.ic)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+
+from representations.matrix_serializer import load_vocabulary, save_vocabulary
+
+
+def build_ivf_index(path, m, iw, num_lists=1024, iterations=10, sample_size=100000, seed=17, chunk_size=100000):
+    """
+    Builds an inverted-file (IVF) index of normalized vectors and saves it to the directory path.ivf.
+    The vectors are clustered by spherical k-means (trained on a sample of sample_size of them) into num_lists lists
+    (at most one per vector of the sample).
+    centroids.npy holds the normalized centroids, vectors.npy the vectors in float16, grouped by list, ids.npy their
+    rows in m (and positions.npy the inverse), and offsets.npy where each list starts (and where the last one ends);
+    vocab holds iw.
+    """
+    directory = path + '.ivf'
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    rnd = np.random.RandomState(seed)
+    sample = m[np.sort(rnd.choice(m.shape[0], min(sample_size, m.shape[0]), replace=False))]
+    # Every list starts from a distinct vector of the sample.
+    num_lists = max(1, min(num_lists, len(sample)))
+    centroids = train_centroids(np.asarray(sample, dtype=np.float32), num_lists, iterations, rnd, chunk_size)
+
+    lists = np.concatenate([nearest_centroids(np.asarray(m[start:start + chunk_size], dtype=np.float32), centroids)
+                            for start in xrange(0, m.shape[0], chunk_size)] + [np.zeros(0, dtype=np.int64)])
+    ids = np.argsort(lists, kind='mergesort')
+    offsets = np.zeros(num_lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(lists, minlength=num_lists))
+
+    vectors = np.lib.format.open_memmap(os.path.join(directory, 'vectors.npy'), mode='w+', dtype=np.float16,
+                                        shape=(m.shape[0], m.shape[1]))
+    for start in xrange(0, m.shape[0], chunk_size):
+        vectors[start:start + chunk_size] = m[ids[start:start + chunk_size]]
+    del vectors
+    np.save(os.path.join(directory, 'centroids.npy'), centroids)
+    np.save(os.path.join(directory, 'ids.npy'), ids)
+    np.save(os.path.join(directory, 'positions.npy'), np.argsort(ids))
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    save_vocabulary(os.path.join(directory, 'vocab'), iw, binary=True)
+
+
+def train_centroids(sample, num_lists, iterations, rnd, chunk_size=100000):
+    """
+    Spherical k-means: centroids are the normalized sums of their vectors. Empty clusters are re-seeded with random
+    vectors of the sample.
+    """
+    centroids = sample[rnd.choice(len(sample), num_lists, replace=False)]
+    for i in xrange(iterations):
+        lists = np.concatenate([nearest_centroids(sample[start:start + chunk_size], centroids)
+                                for start in xrange(0, len(sample), chunk_size)])
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, sample)
+        empty = np.flatnonzero(np.bincount(lists, minlength=num_lists) == 0)
+        sums[empty] = sample[rnd.choice(len(sample), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def nearest_centroids(vectors, centroids):
+    return np.argmax(vectors.dot(centroids.T), axis=1)
+
+
+def normalize(m):
+    norm = np.sqrt(np.einsum('ij,ij->i', m, m))
+    norm[norm == 0] = 1
+    return m / norm[:, np.newaxis]
+
+
+class IVFIndex:
+    """
+    An IVF index saved by build_ivf_index, memory-mapped. A query is scored against the centroids, and then exactly
+    (in float16 precision) against the vectors of its nprobe closest lists: a larger nprobe trades latency for recall.
+    """
+
+    def __init__(self, path):
+        directory = path + '.ivf'
+        self.centroids = np.load(os.path.join(directory, 'centroids.npy'))
+        self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r')
+        self.positions = np.load(os.path.join(directory, 'positions.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        self.wi, self.iw = load_vocabulary(os.path.join(directory, 'vocab'))
+        self.dim = self.vectors.shape[1]
+
+    def represent(self, w):
+        """
+        The (float16-rounded) vector of the word, found through its position in the lists.
+        """
+        if w not in self.wi:
+            return np.zeros(self.dim, dtype=np.float32)
+        return self.vectors[self.positions[self.wi[w]]].astype(np.float32)
+
+    def search(self, queries, n=10, nprobe=8):
+        """
+        Returns the indices (into iw) and scores of the approximate n closest vectors to each query, arrays of shape
+        (len(queries), n) in descending order; missing neighbours (if the probed lists are too short) are -1 and -inf.
+        Assumes the vectors have been normalized.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-queries.dot(self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        ids = np.zeros((len(queries), n), dtype=np.int64) - 1
+        scores = np.zeros((len(queries), n), dtype=np.float32) - np.inf
+        for q in xrange(len(queries)):
+            positions = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probes[q]])
+            candidate_scores = self.vectors[positions].astype(np.float32).dot(queries[q])
+            k = min(n, len(positions))
+            if k == 0:
+                continue
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            top = top[np.argsort(-candidate_scores[top], kind='mergesort')]
+            ids[q, :k] = self.ids[positions[top]]
+            scores[q, :k] = candidate_scores[top]
+        return ids, scores
+
+    def closest(self, w, n=10, nprobe=8):
+        """
+        Approximates Embedding.closest.
+        """
+        ids, scores = self.search(self.represent(w), n, nprobe)
+        return [(s, self.iw[i]) for i, s in zip(ids[0], scores[0]) if i >= 0]
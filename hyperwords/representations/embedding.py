@@ -1,117 +1,185 @@
-import heapq
-
-import numpy as np
-
-from representations.matrix_serializer import load_vocabulary
-
-
-class Embedding:
-    """
-    Base class for all embeddings. SGNS can be directly instantiated with it.
-    """
-    
-    def __init__(self, path, normalize=True):
-        self.m = np.load(path + '.npy')
-        if normalize:
-            self.normalize()
-        self.dim = self.m.shape[1]
-        self.wi, self.iw = load_vocabulary(path + '.vocab')
-
-    def normalize(self):
-        norm = np.sqrt(np.sum(self.m * self.m, axis=1))
-        self.m = self.m / norm[:, np.newaxis]
-
-    def represent(self, w):
-        if w in self.wi:
-            return self.m[self.wi[w], :]
-        else:
-            return np.zeros(self.dim)
-
-    def similarity(self, w1, w2):
-        """
-        Assumes the vectors have been normalized.
-        """
-        return self.represent(w1).dot(self.represent(w2))
-
-    def closest(self, w, n=10):
-        """
-        Assumes the vectors have been normalized.
-        """
-        scores = self.m.dot(self.represent(w))
-        return heapq.nlargest(n, zip(scores, self.iw))
-    
-
-class SVDEmbedding(Embedding):
-    """
-    SVD embeddings.
-    Enables controlling the weighted exponent of the eigenvalue matrix (eig).
-    Context embeddings can be created with "transpose".
-    """
-    
-    def __init__(self, path, normalize=True, eig=0.0, transpose=False):
-        if transpose:
-            ut = np.load(path + '.vt.npy')
-            self.wi, self.iw = load_vocabulary(path + '.contexts.vocab')
-        else:
-            ut = np.load(path + '.ut.npy')
-            self.wi, self.iw = load_vocabulary(path + '.words.vocab')
-        s = np.load(path + '.s.npy')
-        
-        if eig == 0.0:
-            self.m = ut.T
-        elif eig == 1.0:
-            self.m = s * ut.T
-        else:
-            self.m = np.power(s, eig) * ut.T
-
-        self.dim = self.m.shape[1]
-
-        if normalize:
-            self.normalize()
-
-
-class EnsembleEmbedding(Embedding):
-    """
-    Adds the vectors of two distinct embeddings (of the same dimensionality) to create a new representation.
-    Commonly used by adding the context embeddings to the word embeddings.
-    """
-
-    def __init__(self, emb1, emb2, normalize=False):
-        """
-        Assume emb1.dim == emb2.dim
-        """
-        self.dim = emb1.dim
-        
-        vocab1 = emb1.wi.viewkeys()
-        vocab2 = emb2.wi.viewkeys()
-        joint_vocab = list(vocab1 & vocab2)
-        only_vocab1 = list(vocab1 - vocab2)
-        only_vocab2 = list(vocab2 - vocab1)
-        self.iw = joint_vocab + only_vocab1 + only_vocab2
-        self.wi = dict([(w, i) for i, w in enumerate(self.iw)])
-
-        m_joint = emb1.m[[emb1.wi[w] for w in joint_vocab]] + emb2.m[[emb2.wi[w] for w in joint_vocab]]
-        m_only1 = emb1.m[[emb1.wi[w] for w in only_vocab1]]
-        m_only2 = emb2.m[[emb2.wi[w] for w in only_vocab2]]
-        self.m = np.vstack([m_joint, m_only1, m_only2])
-        
-        if normalize:
-            self.normalize()
-
-
-class DualEmbeddingWrapper:
-    """
-    Wraps word and context embeddings to allow investigation of first-order similarity.
-    """
-
-    def __init__(self, ew, ec):
-        self.ew = ew
-        self.ec = ec
-    
-    def closest_contexts(self, w, n=10):
-        scores = self.ec.m.dot(self.ew.represent(w))
-        pairs = zip(scores, self.ec.iw)[1:]
-        return heapq.nlargest(n, pairs)
-    
-    def similarity_first_order(self, w, c):
-        return self.ew.represent(w).dot(self.ec.represent(c))
+import heapq
+
+import numpy as np
+
+from representations.matrix_serializer import load_vocabulary, is_normalized_embedding, is_word2vec_binary, \
+    load_word2vec_binary
+
+
+class Embedding:
+    """
+    Base class for all embeddings. SGNS can be directly instantiated with it.
+    With mmap, the matrix is memory-mapped read-only (and its pages are shared by all the processes that map it);
+    an embedding saved as normalized (see embedding2numpy.py) is then used as is, without any copy.
+    A path to a file in word2vec's binary format (*.bin) is read directly (and never memory-mapped).
+    """
+    
+    def __init__(self, path, normalize=True, mmap=False):
+        if is_word2vec_binary(path):
+            self.m, self.iw = load_word2vec_binary(path)
+            self.wi = dict([(w, i) for i, w in enumerate(self.iw)])
+            if normalize:
+                self.normalize()
+            self.dim = self.m.shape[1]
+            return
+        self.m = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+        if normalize and not is_normalized_embedding(path):
+            self.normalize()
+        self.dim = self.m.shape[1]
+        self.wi, self.iw = load_vocabulary(path + '.vocab')
+
+    def normalize(self):
+        norm = np.sqrt(np.einsum('ij,ij->i', self.m, self.m))
+        self.m = self.m / norm[:, np.newaxis]
+
+    def represent(self, w):
+        if w in self.wi:
+            return self.m[self.wi[w], :]
+        else:
+            return np.zeros(self.dim)
+
+    def similarity(self, w1, w2):
+        """
+        Assumes the vectors have been normalized.
+        """
+        return self.represent(w1).dot(self.represent(w2))
+
+    def similarity_batch(self, words1, words2):
+        """
+        The similarities of the pairs (words1[i], words2[i]), computed together with one row-wise einsum.
+        Assumes the vectors have been normalized.
+        """
+        ids1 = np.array([self.wi[w] if w in self.wi else -1 for w in words1], dtype=np.int64)
+        ids2 = np.array([self.wi[w] if w in self.wi else -1 for w in words2], dtype=np.int64)
+        rows1 = self.m[np.maximum(ids1, 0)]
+        rows2 = self.m[np.maximum(ids2, 0)]
+        return np.einsum('ij,ij->i', rows1, rows2) * ((ids1 >= 0) & (ids2 >= 0))
+
+    def closest(self, w, n=10):
+        """
+        Assumes the vectors have been normalized.
+        """
+        scores = self.m.dot(self.represent(w))
+        return heapq.nlargest(n, zip(scores, self.iw))
+
+    def closest_batch(self, words, n=10, exclude=False, max_scores=2 ** 24):
+        """
+        Finds the n closest words to each of the given words, scoring all of them at once with one matrix product per
+        chunk of the vocabulary (sized so that a chunk has at most max_scores scores) and keeping the running top n
+        with argpartition. With exclude, every word is left out of its own neighbours.
+        Returns the indices (into iw) and scores of the neighbours, arrays of shape (len(words), n) in descending order.
+        Assumes the vectors have been normalized.
+        """
+        queries = np.vstack([self.represent(w) for w in words] + [np.zeros((0, self.dim))]).astype(self.m.dtype)
+        query_ids = np.array([self.wi[w] if w in self.wi else -1 for w in words], dtype=np.int64)
+        rows = np.arange(len(words))[:, np.newaxis]
+        n = min(n, self.m.shape[0] - 1 if exclude else self.m.shape[0])
+        chunk_size = max(n, max_scores // max(1, len(words)))
+        best_ids = np.zeros((len(words), 0), dtype=np.int64)
+        best_scores = np.zeros((len(words), 0), dtype=self.m.dtype)
+        for start in xrange(0, self.m.shape[0], chunk_size):
+            end = min(start + chunk_size, self.m.shape[0])
+            scores = queries.dot(self.m[start:end].T)
+            if exclude:
+                inside = np.flatnonzero((query_ids >= start) & (query_ids < end))
+                scores[inside, query_ids[inside] - start] = -np.inf
+            ids, scores = top_columns(scores, n)
+            ids = np.hstack([best_ids, ids + start])
+            scores = np.hstack([best_scores, scores])
+            top = top_columns(scores, n)[0]
+            best_ids = ids[rows, top]
+            best_scores = scores[rows, top]
+        order = np.argsort(-best_scores, axis=1, kind='mergesort')
+        return best_ids[rows, order], best_scores[rows, order]
+    
+
+def top_columns(scores, n):
+    """
+    The column indices and values of the (unordered) n largest scores in every row.
+    """
+    if scores.shape[1] <= n:
+        top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    else:
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    return top, scores[np.arange(scores.shape[0])[:, np.newaxis], top]
+
+
+class SVDEmbedding(Embedding):
+    """
+    SVD embeddings.
+    Enables controlling the weighted exponent of the eigenvalue matrix (eig).
+    Context embeddings can be created with "transpose".
+    With mmap, the factors are memory-mapped; without eigenvalue weighting (eig=0) and normalization, nothing is copied.
+    """
+    
+    def __init__(self, path, normalize=True, eig=0.0, transpose=False, mmap=False):
+        mmap_mode = 'r' if mmap else None
+        if transpose:
+            ut = np.load(path + '.vt.npy', mmap_mode=mmap_mode)
+            self.wi, self.iw = load_vocabulary(path + '.contexts.vocab')
+        else:
+            ut = np.load(path + '.ut.npy', mmap_mode=mmap_mode)
+            self.wi, self.iw = load_vocabulary(path + '.words.vocab')
+        s = np.load(path + '.s.npy')
+        
+        if eig == 0.0:
+            self.m = ut.T
+        elif eig == 1.0:
+            self.m = s * ut.T
+        else:
+            self.m = np.power(s, eig) * ut.T
+
+        self.dim = self.m.shape[1]
+
+        if normalize:
+            self.normalize()
+
+
+class EnsembleEmbedding(Embedding):
+    """
+    Adds the vectors of two distinct embeddings (of the same dimensionality) to create a new representation.
+    Commonly used by adding the context embeddings to the word embeddings.
+    """
+
+    def __init__(self, emb1, emb2, normalize=False):
+        """
+        Assume emb1.dim == emb2.dim
+        """
+        self.dim = emb1.dim
+        
+        # Plain dicts for the bulk lookups below, even if the vocabularies are memory-mapped.
+        wi1 = dict([(w, i) for i, w in enumerate(emb1.iw)])
+        wi2 = dict([(w, i) for i, w in enumerate(emb2.iw)])
+        vocab1 = wi1.viewkeys()
+        vocab2 = wi2.viewkeys()
+        joint_vocab = list(vocab1 & vocab2)
+        only_vocab1 = list(vocab1 - vocab2)
+        only_vocab2 = list(vocab2 - vocab1)
+        self.iw = joint_vocab + only_vocab1 + only_vocab2
+        self.wi = dict([(w, i) for i, w in enumerate(self.iw)])
+
+        m_joint = emb1.m[[wi1[w] for w in joint_vocab]] + emb2.m[[wi2[w] for w in joint_vocab]]
+        m_only1 = emb1.m[[wi1[w] for w in only_vocab1]]
+        m_only2 = emb2.m[[wi2[w] for w in only_vocab2]]
+        self.m = np.vstack([m_joint, m_only1, m_only2])
+        
+        if normalize:
+            self.normalize()
+
+
+class DualEmbeddingWrapper:
+    """
+    Wraps word and context embeddings to allow investigation of first-order similarity.
+    """
+
+    def __init__(self, ew, ec):
+        self.ew = ew
+        self.ec = ec
+    
+    def closest_contexts(self, w, n=10):
+        scores = self.ec.m.dot(self.ew.represent(w))
+        pairs = zip(scores, self.ec.iw)[1:]
+        return heapq.nlargest(n, pairs)
+    
+    def similarity_first_order(self, w, c):
+        return self.ew.represent(w).dot(self.ec.represent(c))
@@ -1,73 +1,228 @@
-import heapq
-
-from scipy.sparse import dok_matrix, csr_matrix
-import numpy as np
-
-from representations.matrix_serializer import load_vocabulary, load_matrix
-
-
-class Explicit:
-    """
-    Base class for explicit representations. Assumes that the serialized input is e^PMI.
-    """
-    
-    def __init__(self, path, normalize=True):
-        self.wi, self.iw = load_vocabulary(path + '.words.vocab')
-        self.ci, self.ic = load_vocabulary(path + '.contexts.vocab')
-        self.m = load_matrix(path)
-        self.m.data = np.log(self.m.data)
-        self.normal = normalize
-        if normalize:
-            self.normalize()
-    
-    def normalize(self):
-        m2 = self.m.copy()
-        m2.data **= 2
-        norm = np.reciprocal(np.sqrt(np.array(m2.sum(axis=1))[:, 0]))
-        normalizer = dok_matrix((len(norm), len(norm)))
-        normalizer.setdiag(norm)
-        self.m = normalizer.tocsr().dot(self.m)
-    
-    def represent(self, w):
-        if w in self.wi:
-            return self.m[self.wi[w], :]
-        else:
-            return csr_matrix((1, len(self.ic)))
-    
-    def similarity_first_order(self, w, c):
-        return self.m[self.wi[w], self.ci[c]]
-    
-    def similarity(self, w1, w2):
-        """
-        Assumes the vectors have been normalized.
-        """
-        return self.represent(w1).dot(self.represent(w2).T)[0, 0]
-    
-    def closest_contexts(self, w, n=10):
-        """
-        Assumes the vectors have been normalized.
-        """
-        scores = self.represent(w)
-        return heapq.nlargest(n, zip(scores.data, [self.ic[i] for i in scores.indices]))
-    
-    def closest(self, w, n=10):
-        """
-        Assumes the vectors have been normalized.
-        """
-        scores = self.m.dot(self.represent(w).T).T.tocsr()
-        return heapq.nlargest(n, zip(scores.data, [self.iw[i] for i in scores.indices]))
-
-
-class PositiveExplicit(Explicit):
-    """
-    Positive PMI (PPMI) with negative sampling (neg).
-    Negative samples shift the PMI matrix before truncation.
-    """
-    
-    def __init__(self, path, normalize=True, neg=1):
-        Explicit.__init__(self, path, False)
-        self.m.data -= np.log(neg)
-        self.m.data[self.m.data < 0] = 0
-        self.m.eliminate_zeros()
-        if normalize:
-            self.normalize()
+import heapq
+from multiprocessing.pool import ThreadPool
+
+from scipy.sparse import dok_matrix, csr_matrix, vstack
+import numpy as np
+
+from representations.embedding import top_columns
+from representations.matrix_serializer import load_vocabulary, load_matrix, ShardedMatrix
+
+
+class Explicit:
+    """
+    Base class for explicit representations. Assumes that the serialized input is e^PMI.
+    A sharded matrix can be opened lazily, in which case rows are read and transformed only when accessed.
+    """
+    
+    def __init__(self, path, normalize=True, lazy=False):
+        self.wi, self.iw = load_vocabulary(path + '.words.vocab')
+        self.ci, self.ic = load_vocabulary(path + '.contexts.vocab')
+        self.normal = normalize
+        self.mt = None
+        if lazy:
+            self.m = ShardedMatrix(path, self.transform)
+        else:
+            self.m = self.transform(load_matrix(path))
+    
+    def transform(self, m):
+        """
+        Turns (a block of rows of) the serialized e^PMI matrix into this representation.
+        """
+        m.data = np.log(m.data)
+        if self.normal:
+            m = normalize_rows(m)
+        return m
+    
+    def normalize(self):
+        if isinstance(self.m, ShardedMatrix):
+            # Rows are transformed whenever they are read, so they are normalized from then on.
+            transform = self.m.transform
+            self.m.transform = lambda m: normalize_rows(transform(m))
+        else:
+            self.m = normalize_rows(self.m)
+    
+    def represent(self, w):
+        if w in self.wi:
+            return self.m[self.wi[w], :]
+        else:
+            return csr_matrix((1, len(self.ic)))
+    
+    def similarity_first_order(self, w, c):
+        return self.m[self.wi[w], self.ci[c]]
+    
+    def similarity(self, w1, w2):
+        """
+        Assumes the vectors have been normalized.
+        """
+        return self.represent(w1).dot(self.represent(w2).T)[0, 0]
+    
+    def closest_contexts(self, w, n=10):
+        """
+        Assumes the vectors have been normalized.
+        """
+        scores = self.represent(w)
+        return heapq.nlargest(n, zip(scores.data, [self.ic[i] for i in scores.indices]))
+    
+    def closest(self, w, n=10):
+        """
+        Assumes the vectors have been normalized.
+        """
+        scores = self.m.dot(self.represent(w).T).T.tocsr()
+        return heapq.nlargest(n, zip(scores.data, [self.iw[i] for i in scores.indices]))
+    
+    def index_contexts(self):
+        """
+        Precomputes a transposed (CSC) copy of the matrix, which closest_batch then uses to score queries through the
+        columns of their contexts only.
+        """
+        m = self.m.tocsr() if isinstance(self.m, ShardedMatrix) else self.m
+        self.mt = m.tocsc()
+    
+    def similarity_batch(self, words1, words2):
+        """
+        The similarities of the pairs (words1[i], words2[i]), computed together.
+        Assumes the vectors have been normalized.
+        """
+        if len(words1) == 0:
+            return np.zeros(0)
+        rows1 = vstack([self.represent(w) for w in words1], format='csr')
+        rows2 = vstack([self.represent(w) for w in words2], format='csr')
+        return np.asarray(rows1.multiply(rows2).sum(axis=1))[:, 0]
+    
+    def closest_batch(self, words, n=10, exclude=False, threads=1, max_scores=2 ** 24):
+        """
+        Finds the n closest words to each of the given words. The work is split into chunks that are scored by a pool
+        of threads (SciPy releases the GIL in sparse products): chunks of rows of the matrix (or of its shards, if
+        lazy), or, after index_contexts(), chunks of queries, multiplied by the transposed matrix. Chunks are sized so
+        that the threads together hold at most max_scores scores.
+        Only words with a nonzero score are neighbours, as in closest(); rows with fewer than n of them are padded
+        with id -1 and score -inf.
+        Returns the indices (into iw) and scores of the neighbours, arrays of shape (len(words), n) in descending order.
+        Assumes the vectors have been normalized.
+        """
+        if len(words) == 0:
+            return np.zeros((0, n), dtype=np.int64), np.zeros((0, n))
+        queries = vstack([self.represent(w) for w in words], format='csr')
+        query_ids = np.array([self.wi[w] if w in self.wi else -1 for w in words], dtype=np.int64)
+        n = min(n, len(self.iw) - 1 if exclude else len(self.iw))
+        
+        if self.mt is not None:
+            chunk_size = max(1, max_scores // (max(1, threads) * len(self.iw)))
+            def score(start):
+                scores = dense_scores(queries[start:start + chunk_size].dot(self.mt.T))
+                return top_neighbours(scores, 0, query_ids[start:start + chunk_size], n, exclude)
+            results = list(map_chunks(score, xrange(0, len(words), chunk_size), threads))
+            ids = np.vstack([chunk_ids for chunk_ids, chunk_scores in results])
+            scores = np.vstack([chunk_scores for chunk_ids, chunk_scores in results])
+        else:
+            chunk_size = max(n, max_scores // (max(1, threads) * len(words)))
+            def score(chunk):
+                if isinstance(self.m, ShardedMatrix):
+                    start, block = self.m.offsets[chunk], self.m.shard(chunk)
+                else:
+                    start, block = chunk, self.m[chunk:chunk + chunk_size]
+                ids = np.zeros((len(words), 0), dtype=np.int64)
+                scores = np.zeros((len(words), 0))
+                for offset in xrange(0, block.shape[0], chunk_size):
+                    block_scores = dense_scores(block[offset:offset + chunk_size].dot(queries.T).T)
+                    block_ids, block_scores = top_neighbours(block_scores, start + offset, query_ids, n, exclude)
+                    ids, scores = top_neighbours_of(np.hstack([ids, block_ids]), np.hstack([scores, block_scores]), n)
+                return ids, scores
+            if isinstance(self.m, ShardedMatrix):
+                chunks = xrange(self.m.num_shards())
+            else:
+                chunks = xrange(0, len(self.iw), chunk_size)
+            ids = np.zeros((len(words), 0), dtype=np.int64)
+            scores = np.zeros((len(words), 0))
+            for chunk_ids, chunk_scores in map_chunks(score, chunks, threads):
+                ids, scores = top_neighbours_of(np.hstack([ids, chunk_ids]), np.hstack([scores, chunk_scores]), n)
+        
+        rows = np.arange(len(words))[:, np.newaxis]
+        order = np.argsort(-scores, axis=1, kind='mergesort')
+        ids, scores = ids[rows, order], scores[rows, order]
+        ids[scores == -np.inf] = -1
+        return ids, scores
+
+
+class PositiveExplicit(Explicit):
+    """
+    Positive PMI (PPMI) with negative sampling (neg).
+    Negative samples shift the PMI matrix before truncation.
+    """
+    
+    def __init__(self, path, normalize=True, neg=1, lazy=False):
+        self.neg = neg
+        Explicit.__init__(self, path, normalize, lazy)
+    
+    def transform(self, m):
+        m.data = np.log(m.data)
+        m.data -= np.log(self.neg)
+        m.data[m.data < 0] = 0
+        m.eliminate_zeros()
+        if self.normal:
+            m = normalize_rows(m)
+        return m
+
+
+class TransformedExplicit(Explicit):
+    """
+    An explicit representation whose serialized matrix is already transformed (e.g. cached by RepresentationCache).
+    """
+    
+    def __init__(self, path, lazy=False):
+        Explicit.__init__(self, path, False, lazy)
+    
+    def transform(self, m):
+        return m
+
+
+def map_chunks(func, chunks, threads):
+    """
+    Yields func of every chunk, in order, computed in a pool of threads if threads > 1.
+    """
+    if threads <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    pool = ThreadPool(threads)
+    try:
+        for result in pool.imap(func, chunks):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def dense_scores(scores):
+    """
+    A sparse block of scores as a dense array, with -inf in place of the scores that are not stored.
+    """
+    scores = scores.tocoo()
+    dense = np.zeros(scores.shape) - np.inf
+    dense[scores.row, scores.col] = scores.data
+    return dense
+
+
+def top_neighbours(scores, start, query_ids, n, exclude):
+    """
+    The ids (offset by start) and scores of the n best columns of every row of a dense block of scores.
+    """
+    if exclude:
+        inside = np.flatnonzero((query_ids >= start) & (query_ids < start + scores.shape[1]))
+        scores[inside, query_ids[inside] - start] = -np.inf
+    top, top_scores = top_columns(scores, n)
+    return top + start, top_scores
+
+
+def top_neighbours_of(ids, scores, n):
+    top, top_scores = top_columns(scores, n)
+    return ids[np.arange(len(ids))[:, np.newaxis], top], top_scores
+
+
+def normalize_rows(m):
+    m2 = m.copy()
+    m2.data **= 2
+    norm = np.reciprocal(np.sqrt(np.array(m2.sum(axis=1))[:, 0]))
+    normalizer = dok_matrix((len(norm), len(norm)))
+    normalizer.setdiag(norm)
+    return normalizer.tocsr().dot(m)
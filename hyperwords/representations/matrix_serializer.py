@@ -1,38 +1,583 @@
-import numpy as np
-from scipy.sparse import csr_matrix
-
-
-def save_matrix(f, m):
-    np.savez_compressed(f, data=m.data, indices=m.indices, indptr=m.indptr, shape=m.shape)
-
-
-def load_matrix(f):
-    if not f.endswith('.npz'):
-        f += '.npz'
-    loader = np.load(f)
-    return csr_matrix((loader['data'], loader['indices'], loader['indptr']), shape=loader['shape'])
-
-
-def save_vocabulary(path, vocab):
-    with open(path, 'w') as f:
-        for w in vocab:
-            print >>f, w
-
-
-def load_vocabulary(path):
-    with open(path) as f:
-        vocab = [line.strip() for line in f if len(line) > 0]
-    return dict([(a, i) for i, a in enumerate(vocab)]), vocab
-
-
-def save_count_vocabulary(path, vocab):
-    with open(path, 'w') as f:
-        for w, c in vocab:
-            print >>f, w, c
-
-
-def load_count_vocabulary(path):
-    with open(path) as f:
-        # noinspection PyTypeChecker
-        vocab = dict([line.strip().split() for line in f if len(line) > 0])
-    return vocab
+from itertools import islice, izip
+import os
+import sys
+import zlib
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+
+
+def save_matrix(f, m):
+    np.savez_compressed(f, data=m.data, indices=m.indices, indptr=m.indptr, shape=m.shape)
+
+
+def load_matrix(f):
+    if not f.endswith('.npz'):
+        if is_sharded_matrix(f) and not os.path.exists(f + '.npz'):
+            return ShardedMatrix(f).tocsr()
+        f += '.npz'
+    loader = np.load(f)
+    return csr_matrix((loader['data'], loader['indices'], loader['indptr']), shape=loader['shape'])
+
+
+def is_sharded_matrix(f):
+    return os.path.exists(os.path.join(f + '.shards', 'offsets.npy'))
+
+
+def save_sharded_matrix(f, blocks, shape):
+    """
+    Saves a sparse matrix given as consecutive blocks of rows (CSR) to the directory f.shards, one uncompressed
+    (memory-mappable) shard per block, so a matrix never has to be held in memory as a whole.
+    """
+    path = f + '.shards'
+    if not os.path.exists(path):
+        os.makedirs(path)
+    offsets = [0]
+    for i, block in enumerate(blocks):
+        np.save(os.path.join(path, '%d.data.npy' % i), block.data)
+        np.save(os.path.join(path, '%d.indices.npy' % i), block.indices)
+        np.save(os.path.join(path, '%d.indptr.npy' % i), block.indptr)
+        offsets.append(offsets[-1] + block.shape[0])
+    if offsets[-1] != shape[0]:
+        raise Exception('Expected %d rows but got %d.' % (shape[0], offsets[-1]))
+    np.save(os.path.join(path, 'shape.npy'), np.array(shape, dtype=np.int64))
+    np.save(os.path.join(path, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+
+
+class ShardedMatrix:
+    """
+    A sparse matrix saved by save_sharded_matrix, opened lazily: shards are memory-mapped (copy-on-write) on access.
+    An optional row-wise transform is applied to every block of rows that is read.
+    Single rows are read from read-only maps of the shards, which stay open for later rows.
+    """
+
+    def __init__(self, f, transform=None):
+        self.path = f + '.shards'
+        self.shape = tuple(np.load(os.path.join(self.path, 'shape.npy')).tolist())
+        self.offsets = np.load(os.path.join(self.path, 'offsets.npy'))
+        self.transform = transform
+        self.row_shards = {}
+
+    def num_shards(self):
+        return len(self.offsets) - 1
+
+    def shard(self, i):
+        arrays = [np.load(os.path.join(self.path, '%d.%s.npy' % (i, name)), mmap_mode='c')
+                  for name in ['data', 'indices', 'indptr']]
+        shape = (self.offsets[i + 1] - self.offsets[i], self.shape[1])
+        block = csr_matrix((arrays[0], arrays[1], arrays[2]), shape=shape, copy=False)
+        return self.transform(block) if self.transform is not None else block
+
+    def iter_blocks(self):
+        """
+        Yields the first row and the (transformed) CSR block of every shard.
+        """
+        for i in xrange(self.num_shards()):
+            yield self.offsets[i], self.shard(i)
+
+    def row(self, i):
+        shard = np.searchsorted(self.offsets, i, side='right') - 1
+        if shard not in self.row_shards:
+            # Plain ndarray views of the memory maps, whose element access is much faster than np.memmap's.
+            self.row_shards[shard] = [np.load(os.path.join(self.path, '%d.%s.npy' % (shard, name)),
+                                              mmap_mode='r').view(np.ndarray) for name in ['data', 'indices', 'indptr']]
+        arrays = self.row_shards[shard]
+        local = i - self.offsets[shard]
+        start, end = arrays[2][local], arrays[2][local + 1]
+        row = csr_matrix((np.array(arrays[0][start:end]), np.array(arrays[1][start:end]), [0, end - start]),
+                         shape=(1, self.shape[1]))
+        return self.transform(row) if self.transform is not None else row
+
+    def __getitem__(self, key):
+        i, j = key
+        row = self.row(i)
+        if isinstance(j, slice):
+            return row[:, j]
+        return row[0, j]
+
+    def dot(self, other):
+        return vstack([block.dot(other) for start, block in self.iter_blocks()])
+
+    def tocsr(self):
+        return vstack([block for start, block in self.iter_blocks()], format='csr')
+
+
+def save_embedding(path, m, iw, normalized=False):
+    """
+    Saves a dense embedding as path.npy (C-contiguous, so it can be memory-mapped as is) and path.vocab.
+    A normalized embedding is marked with an empty path.normalized file, so loading it can skip normalization.
+    """
+    np.save(path + '.npy', np.ascontiguousarray(m))
+    save_vocabulary(path + '.vocab', iw)
+    if normalized:
+        open(path + '.normalized', 'w').close()
+    elif os.path.exists(path + '.normalized'):
+        os.remove(path + '.normalized')
+
+
+def is_normalized_embedding(path):
+    return os.path.exists(path + '.normalized')
+
+
+def save_text_vectors(path, m, iw, precision=None, header=False, chunk_size=10000):
+    """
+    Saves a dense embedding in the textual format: a word and its vector per line, optionally after a "rows dim"
+    header line. Rows are formatted a block of chunk_size at a time, with precision significant digits; by default,
+    with as many as reading the vectors back exactly takes (9 for float32, the shortest repr for float64).
+    """
+    if precision is not None:
+        component_format = ' %%.%dg' % precision
+    elif m.dtype.itemsize <= 4:
+        component_format = ' %.9g'
+    else:
+        component_format = ' %r'
+    row_format = '%s' + component_format * m.shape[1] + '\n'
+    words = iter(iw)
+    with open(path, 'w') as f:
+        if header:
+            f.write('%d %d\n' % m.shape)
+        for start in xrange(0, m.shape[0], chunk_size):
+            block = np.asarray(m[start:start + chunk_size]).tolist()
+            f.write(''.join([row_format % tuple([w] + row) for w, row in zip(islice(words, len(block)), block)]))
+
+
+def load_text_vectors(path, chunk_size=10000):
+    """
+    Reads a dense embedding in the textual format into a preallocated float32 matrix, and returns it with its words
+    (in the order of the file). The shape comes from the "rows dim" header line if there is one; otherwise the file
+    is read twice, to count its lines and then to parse them. Vectors are parsed a block of chunk_size lines at a time.
+    """
+    with open(path) as f:
+        first = f.readline().split()
+    header = len(first) == 2 and first[0].isdigit() and first[1].isdigit()
+    if header:
+        rows, dim = int(first[0]), int(first[1])
+    else:
+        with open(path) as f:
+            rows = sum([1 for line in f if line.strip()])
+        dim = len(first) - 1
+
+    m = np.empty((rows, dim), dtype=np.float32)
+    iw = []
+    with open(path) as f:
+        if header:
+            f.readline()
+        lines = []
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            if len(lines) == chunk_size:
+                parse_text_vectors(m, iw, lines)
+                lines = []
+        parse_text_vectors(m, iw, lines)
+    if len(iw) != rows:
+        raise Exception('Expected %d vectors in %s, found %d' % (rows, path, len(iw)))
+    return m, iw
+
+
+def parse_text_vectors(m, iw, lines):
+    """
+    Parses lines of the textual format into the next rows of m, appending their words to iw.
+    """
+    if len(lines) == 0:
+        return
+    if len(iw) + len(lines) > m.shape[0]:
+        raise Exception('More vectors than expected (%d)' % m.shape[0])
+    words, values = zip(*[line.lstrip().split(' ', 1) for line in lines])
+    block = np.fromstring(' '.join(values), dtype=np.float64, sep=' ')
+    if len(block) != len(lines) * m.shape[1]:
+        raise Exception('Malformed vectors after "%s": expected %d dimensions' % (words[0], m.shape[1]))
+    m[len(iw):len(iw) + len(lines)] = block.reshape(len(lines), m.shape[1])
+    iw.extend(words)
+
+
+def save_word2vec_binary(path, m, iw, chunk_size=10000):
+    """
+    Saves a dense embedding in word2vec's binary format: a "rows dim" header line, and then each word, a space, its
+    vector as raw little-endian float32, and a newline.
+    """
+    words = iter(iw)
+    with open(path, 'wb') as f:
+        f.write('%d %d\n' % m.shape)
+        for start in xrange(0, m.shape[0], chunk_size):
+            block = np.asarray(m[start:start + chunk_size], dtype='<f4')
+            f.write(''.join([w + ' ' + row.tostring() + '\n' for w, row in zip(islice(words, len(block)), block)]))
+
+
+def is_word2vec_binary(path):
+    return path.endswith('.bin') and os.path.isfile(path)
+
+
+def load_word2vec_binary(path, chunk_size=64 * 1024 * 1024):
+    """
+    Reads an embedding in word2vec's binary format into a preallocated float32 matrix, and returns it with its words.
+    The file is streamed chunk_size bytes at a time.
+    """
+    with open(path, 'rb') as f:
+        rows, dim = [int(x) for x in f.readline().split()]
+        m = np.empty((rows, dim), dtype=np.float32)
+        iw = []
+        width = 4 * dim
+        buf = ''
+        while len(iw) < rows:
+            data = f.read(chunk_size)
+            buf += data
+            pos = 0
+            while len(iw) < rows:
+                space = buf.find(' ', pos)
+                if space < 0 or space + 1 + width > len(buf):
+                    break
+                # The newline after the previous vector is optional.
+                m[len(iw)] = np.frombuffer(buf, dtype='<f4', count=dim, offset=space + 1)
+                iw.append(buf[pos:space].lstrip('\n'))
+                pos = space + 1 + width
+            buf = buf[pos:]
+            if not data and len(iw) < rows:
+                raise Exception('Expected %d vectors in %s, found %d' % (rows, path, len(iw)))
+    return m, iw
+
+
+def save_vocabulary(path, vocab, binary=False):
+    """
+    Saves a vocabulary as text, one word per line, and also in the binary format (see save_binary_vocabulary) if
+    binary is set.
+    """
+    vocab = list(vocab)
+    with open(path, 'w') as f:
+        for w in vocab:
+            print >>f, w
+    if binary:
+        save_binary_vocabulary(path, vocab)
+
+
+def load_vocabulary(path):
+    """
+    Returns wi and iw. If the binary vocabulary (see save_binary_vocabulary) is up to date, they are memory-mapped
+    views of it; otherwise, they are a dict and a list read from the text file.
+    """
+    if is_binary_vocabulary(path):
+        vocab = BinaryVocabulary(path)
+        return WordIndex(vocab), vocab
+    with open(path) as f:
+        vocab = [line.strip() for line in f if len(line) > 0]
+    return dict([(a, i) for i, a in enumerate(vocab)]), vocab
+
+
+def save_count_vocabulary(path, vocab, binary=False):
+    """
+    Saves a count vocabulary as text, a word and its count per line, and also in the binary format (see
+    save_binary_vocabulary) if binary is set.
+    """
+    vocab = list(vocab)
+    with open(path, 'w') as f:
+        for w, c in vocab:
+            print >>f, w, c
+    if binary:
+        save_binary_vocabulary(path, [w for w, c in vocab], [c for w, c in vocab])
+
+
+def load_count_vocabulary(path):
+    if is_binary_vocabulary(path):
+        return WordIndex(BinaryVocabulary(path), counts=True)
+    with open(path) as f:
+        # noinspection PyTypeChecker
+        vocab = dict([line.strip().split() for line in f if len(line) > 0])
+    return vocab
+
+
+def save_binary_vocabulary(path, vocab, counts=None):
+    """
+    Saves a vocabulary in the binary format: a directory path.bin of uncompressed (memory-mappable) arrays.
+    blob.npy holds all the (UTF-8) words back to back, offsets.npy where each word starts (and where the last one ends),
+    table.npy an open-addressing hash table of word ids (for O(1) lookups), and counts.npy their counts, if any.
+    """
+    directory = path + '.bin'
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    save_words(os.path.join(directory, 'blob.npy'), os.path.join(directory, 'offsets.npy'), vocab)
+    np.save(os.path.join(directory, 'table.npy'), hash_table(vocab))
+    if counts is not None:
+        np.save(os.path.join(directory, 'counts.npy'), np.array(counts, dtype=np.int64))
+    elif os.path.exists(os.path.join(directory, 'counts.npy')):
+        os.remove(os.path.join(directory, 'counts.npy'))
+
+
+def save_words(blob_path, offsets_path, words):
+    """
+    Saves a list of words as a blob of all of them back to back and the offsets where each starts (and the last ends).
+    """
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(w) for w in words])
+    np.save(blob_path, np.frombuffer(''.join(words), dtype=np.uint8))
+    np.save(offsets_path, offsets)
+
+
+def load_words(blob_path, offsets_path):
+    blob = np.load(blob_path).tostring()
+    offsets = np.load(offsets_path).tolist()
+    return [blob[offsets[i]:offsets[i + 1]] for i in xrange(len(offsets) - 1)]
+
+
+def hash_table(vocab):
+    """
+    Builds a linear-probing hash table (of size a power of two, at most half full) that holds the id of every word
+    at or after the slot of its hash, and -1 in empty slots. Colliding words are placed in rounds, in order of their ids.
+    """
+    size = 2
+    while size < 2 * len(vocab):
+        size *= 2
+    table = np.zeros(size, dtype=np.int64) - 1
+    ids = np.arange(len(vocab), dtype=np.int64)
+    slots = np.array([word_hash(w) for w in vocab], dtype=np.int64) & (size - 1)
+    while len(ids) > 0:
+        free = table[slots] < 0
+        placed = np.zeros(len(ids), dtype=np.bool_)
+        first = np.unique(slots[free], return_index=True)[1]
+        placed[np.flatnonzero(free)[first]] = True
+        table[slots[placed]] = ids[placed]
+        ids = ids[~placed]
+        slots = (slots[~placed] + 1) & (size - 1)
+    return table
+
+
+def word_hash(w):
+    return zlib.crc32(w) & 0xffffffff
+
+
+def is_binary_vocabulary(path):
+    """
+    Whether path.bin holds a binary vocabulary that is at least as new as the text vocabulary at path (if any).
+    """
+    offsets_path = os.path.join(path + '.bin', 'offsets.npy')
+    if not os.path.exists(offsets_path):
+        return False
+    return not os.path.exists(path) or os.path.getmtime(offsets_path) >= os.path.getmtime(path)
+
+
+class BinaryVocabulary:
+    """
+    A memory-mapped binary vocabulary that behaves like iw: vocab[i] is the i-th word.
+    Words are looked up with index(w) in the hash table, in O(1).
+    """
+
+    def __init__(self, path):
+        # Plain ndarray views of the memory maps, whose element access is much faster than np.memmap's.
+        directory = path + '.bin'
+        self.blob = np.load(os.path.join(directory, 'blob.npy'), mmap_mode='r').view(np.ndarray)
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r').view(np.ndarray)
+        self.table = np.load(os.path.join(directory, 'table.npy'), mmap_mode='r').view(np.ndarray)
+        self.mask = len(self.table) - 1
+        if os.path.exists(os.path.join(directory, 'counts.npy')):
+            self.counts = np.load(os.path.join(directory, 'counts.npy'), mmap_mode='r').view(np.ndarray)
+        else:
+            self.counts = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('vocabulary index out of range')
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tostring()
+
+    def __iter__(self):
+        blob = self.blob.tostring()
+        offsets = self.offsets.tolist()
+        return (blob[offsets[i]:offsets[i + 1]] for i in xrange(len(self)))
+
+    def index(self, w):
+        """
+        Returns the id of the word, or -1 if it is missing.
+        """
+        slot = word_hash(w) & self.mask
+        while True:
+            i = self.table[slot]
+            if i < 0:
+                return -1
+            if self.blob[self.offsets[i]:self.offsets[i + 1]].tostring() == w:
+                return int(i)
+            slot = (slot + 1) & self.mask
+
+
+class WordIndex:
+    """
+    Wraps a BinaryVocabulary to behave like wi (a dict from words to their ids), or, with counts, like the dict from
+    words to their counts that load_count_vocabulary reads from text.
+    """
+
+    def __init__(self, vocab, counts=False):
+        self.vocab = vocab
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __contains__(self, w):
+        return self.vocab.index(w) >= 0
+
+    def __getitem__(self, w):
+        i = self.vocab.index(w)
+        if i < 0:
+            raise KeyError(w)
+        return str(self.vocab.counts[i]) if self.counts else i
+
+    def get(self, w, default=None):
+        i = self.vocab.index(w)
+        if i < 0:
+            return default
+        return str(self.vocab.counts[i]) if self.counts else i
+
+    def __iter__(self):
+        return iter(self.vocab)
+
+    def keys(self):
+        return list(self.vocab)
+
+    def viewkeys(self):
+        return set(self.vocab)
+
+    def itervalues(self):
+        if self.counts:
+            return (str(c) for c in self.vocab.counts)
+        return iter(xrange(len(self.vocab)))
+
+    def values(self):
+        return list(self.itervalues())
+
+    def iteritems(self):
+        return izip(iter(self.vocab), self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
+def read_counts_matrix(counts_path, chunk_size=64 * 1024 * 1024, verbose=False):
+    """
+    Reads the counts into a sparse matrix (CSR) from the count-word-context textual format, or from the binary format.
+    The text is parsed in chunks of about chunk_size bytes into index and value arrays.
+    """
+    if is_binary_counts(counts_path):
+        return load_binary_counts_matrix(counts_path)
+
+    words = load_count_vocabulary(counts_path + '.words.vocab')
+    contexts = load_count_vocabulary(counts_path + '.contexts.vocab')
+    iw = sorted(words.keys())
+    ic = sorted(contexts.keys())
+    wi = dict([(w, i) for i, w in enumerate(iw)])
+    ci = dict([(c, i) for i, c in enumerate(ic)])
+    rows, cols, data = parse_counts(counts_path, wi, ci, chunk_size, verbose)
+    counts = coo_matrix((data.astype(np.float32), (rows, cols)), shape=(len(iw), len(ic))).tocsr()
+    return counts, iw, ic
+
+
+def parse_counts(counts_path, wi, ci, chunk_size=64 * 1024 * 1024, verbose=False):
+    """
+    Parses the textual counts into arrays of word ids, context ids, and counts (by wi and ci, which map words and
+    contexts to their ids), skipping unknown words and contexts.
+    """
+    rows = [np.zeros(0, dtype=np.int32)]
+    cols = [np.zeros(0, dtype=np.int32)]
+    data = [np.zeros(0, dtype=np.int64)]
+    lines_read = 0
+    for counts, words, contexts in iter_counts_chunks(counts_path, chunk_size):
+        row = lookup(wi, words)
+        col = lookup(ci, contexts)
+        known = (row >= 0) & (col >= 0)
+        rows.append(row[known])
+        cols.append(col[known])
+        data.append(counts[known])
+        lines_read += len(counts)
+        if verbose:
+            print >>sys.stderr, 'Read', lines_read, 'lines'
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(data)
+
+
+def iter_counts_chunks(counts_path, chunk_size=64 * 1024 * 1024):
+    """
+    Yields the textual counts in chunks of about chunk_size bytes, as an array of the counts and the lists of their
+    words and contexts.
+    """
+    with open(counts_path) as f:
+        while True:
+            lines = f.readlines(chunk_size)
+            if len(lines) == 0:
+                break
+            tokens = ''.join(lines).split()
+            if len(tokens) % 3 != 0:
+                raise Exception('Malformed counts in %s.' % counts_path)
+            yield np.fromstring(' '.join(tokens[0::3]), dtype=np.int64, sep=' '), tokens[1::3], tokens[2::3]
+
+
+def lookup(wi, tokens):
+    """
+    Returns the id of every token in wi, or -1 if it is missing.
+    """
+    return np.array(map(wi.get, tokens, [-1] * len(tokens)), dtype=np.int32)
+
+
+def is_binary_counts(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'counts.npy'))
+
+
+def save_binary_counts(path, blocks, nnz, iw, sum_w, ic, sum_c):
+    """
+    Saves counts in the binary format: a directory of uncompressed (memory-mappable) arrays.
+    rows.npy (int32), cols.npy (int32), and counts.npy (int64) hold the nonzero counts, sorted by word and context ids.
+    words.blob.npy and words.offsets.npy hold the alphabetically-sorted vocabulary (see save_words), and
+    words.counts.npy its marginal counts; likewise for contexts. The counts are given as an iterator of
+    (rows, cols, counts) blocks.
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    rows = np.lib.format.open_memmap(os.path.join(path, 'rows.npy'), mode='w+', dtype=np.int32, shape=(nnz,))
+    cols = np.lib.format.open_memmap(os.path.join(path, 'cols.npy'), mode='w+', dtype=np.int32, shape=(nnz,))
+    counts = np.lib.format.open_memmap(os.path.join(path, 'counts.npy'), mode='w+', dtype=np.int64, shape=(nnz,))
+    start = 0
+    for block_rows, block_cols, block_counts in blocks:
+        end = start + len(block_counts)
+        rows[start:end] = block_rows
+        cols[start:end] = block_cols
+        counts[start:end] = block_counts
+        start = end
+    if start != nnz:
+        raise Exception('Expected %d counts but got %d.' % (nnz, start))
+    del rows, cols, counts
+    save_words(os.path.join(path, 'words.blob.npy'), os.path.join(path, 'words.offsets.npy'), iw)
+    save_words(os.path.join(path, 'contexts.blob.npy'), os.path.join(path, 'contexts.offsets.npy'), ic)
+    np.save(os.path.join(path, 'words.counts.npy'), np.asarray(sum_w, dtype=np.int64))
+    np.save(os.path.join(path, 'contexts.counts.npy'), np.asarray(sum_c, dtype=np.int64))
+
+
+def load_binary_counts(path, mmap_mode='r'):
+    """
+    Loads (memory-maps) the binary counts: rows, cols, counts, iw, sum_w, ic, sum_c.
+    """
+    arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in ['rows', 'cols', 'counts']]
+    iw = load_words(os.path.join(path, 'words.blob.npy'), os.path.join(path, 'words.offsets.npy'))
+    ic = load_words(os.path.join(path, 'contexts.blob.npy'), os.path.join(path, 'contexts.offsets.npy'))
+    sum_w = np.load(os.path.join(path, 'words.counts.npy'))
+    sum_c = np.load(os.path.join(path, 'contexts.counts.npy'))
+    return arrays[0], arrays[1], arrays[2], iw, sum_w, ic, sum_c
+
+
+def load_binary_counts_matrix(path):
+    """
+    Reads the binary counts into a sparse matrix (CSR). Rows are already sorted, so no COO conversion is needed.
+    """
+    rows, cols, counts, iw, sum_w, ic, sum_c = load_binary_counts(path)
+    indptr = row_pointers(rows, len(iw))
+    matrix = csr_matrix((counts.astype(np.float32), np.array(cols), indptr), shape=(len(iw), len(ic)))
+    return matrix, iw, ic
+
+
+def row_pointers(rows, num_rows, chunk_size=10000000):
+    """
+    Computes the CSR indptr of sorted row ids, reading them in chunks.
+    """
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    for start in xrange(0, len(rows), chunk_size):
+        indptr[1:] += np.bincount(rows[start:start + chunk_size], minlength=num_rows)
+    np.cumsum(indptr, out=indptr)
+    return indptr
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from representations.embedding import Embedding
+from representations.explicit import TransformedExplicit
+from representations.matrix_serializer import save_embedding, save_sharded_matrix, save_vocabulary, \
+    is_word2vec_binary
+
+
+class RepresentationCache:
+    """
+    An on-disk cache of the final (weighted, ensembled, and normalized) representations built by
+    create_representation. Entries are keyed by the identity (path, size, and modification time) of their source files
+    and by the parameters that affect the matrix, and are evicted least-recently-used (by the modification time of
+    their directories, which is touched on every hit) once the cache exceeds max_bytes.
+    Dense matrices are cached row-major and marked normalized, so a cache hit can be memory-mapped as is.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def key(self, rep_type, path, neg, eig, w_c):
+        identity = [rep_type, 'neg=%d' % neg, 'eig=%r' % eig, 'w+c=%r' % w_c]
+        for source in sorted(source_files(rep_type, path, w_c)):
+            stat = os.stat(source)
+            identity.append('%s %d %r' % (os.path.abspath(source), stat.st_size, stat.st_mtime))
+        return hashlib.sha1('\n'.join(identity)).hexdigest()
+
+    def load(self, rep_type, path, neg, eig, w_c, mmap, build):
+        """
+        Returns the cached representation, or builds it with build() and caches it.
+        """
+        entry = os.path.join(self.directory, self.key(rep_type, path, neg, eig, w_c))
+        if os.path.exists(entry):
+            os.utime(entry, None)
+            return load_entry(entry, mmap)
+        representation = build()
+        staging = tempfile.mkdtemp(prefix='.staging.', dir=self.directory)
+        try:
+            save_entry(staging, representation)
+            os.rename(staging, entry)
+        except (IOError, OSError):
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(entry):
+                raise
+        self.evict(entry)
+        return representation
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used entries (other than keep) until the cache fits in max_bytes.
+        """
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if not name.startswith('.')]
+        entries = sorted([(os.path.getmtime(entry), entry) for entry in entries])
+        sizes = dict([(entry, directory_size(entry)) for last_used, entry in entries])
+        total = sum(sizes.values())
+        for last_used, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+
+def source_files(rep_type, path, w_c):
+    if rep_type == 'PPMI':
+        if os.path.exists(path + '.npz'):
+            sources = [path + '.npz']
+        else:
+            shards = path + '.shards'
+            sources = [os.path.join(shards, name) for name in os.listdir(shards)]
+        return sources + [path + '.words.vocab', path + '.contexts.vocab']
+    elif rep_type == 'SVD':
+        sources = [path + '.ut.npy', path + '.s.npy', path + '.words.vocab']
+        if w_c:
+            sources += [path + '.vt.npy', path + '.contexts.vocab']
+        return sources
+    elif is_word2vec_binary(path):
+        return [path]
+    else:
+        sources = [path + '.words.npy', path + '.words.vocab']
+        if w_c:
+            sources += [path + '.contexts.npy', path + '.contexts.vocab']
+        return sources
+
+
+def save_entry(entry, representation):
+    if hasattr(representation, 'ic'):
+        save_sharded_matrix(os.path.join(entry, 'explicit'), [representation.m], representation.m.shape)
+        save_vocabulary(os.path.join(entry, 'explicit.words.vocab'), representation.iw, binary=True)
+        save_vocabulary(os.path.join(entry, 'explicit.contexts.vocab'), representation.ic, binary=True)
+    else:
+        save_embedding(os.path.join(entry, 'embedding'), representation.m, representation.iw, normalized=True)
+
+
+def load_entry(entry, mmap):
+    if os.path.exists(os.path.join(entry, 'explicit.shards')):
+        return TransformedExplicit(os.path.join(entry, 'explicit'))
+    return Embedding(os.path.join(entry, 'embedding'), True, mmap)
+
+
+def directory_size(path):
+    return sum([os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(path) for name in names])
@@ -1,28 +1,60 @@
-from embedding import SVDEmbedding, EnsembleEmbedding, Embedding
-from explicit import PositiveExplicit
-
-
-def create_representation(args):
-    rep_type = args['<representation>']
-    path = args['<representation_path>']
-    neg = int(args['--neg'])
-    w_c = args['--w+c']
-    eig = float(args['--eig'])
-    
-    if rep_type == 'PPMI':
-        if w_c:
-            raise Exception('w+c is not implemented for PPMI.')
-        else:
-            return PositiveExplicit(path, True, neg)
-        
-    elif rep_type == 'SVD':
-        if w_c:
-            return EnsembleEmbedding(SVDEmbedding(path, False, eig, False), SVDEmbedding(path, False, eig, True), True)
-        else:
-            return SVDEmbedding(path, True, eig)
-        
-    else:
-        if w_c:
-            return EnsembleEmbedding(Embedding(path + '.words', False), Embedding(path + '.contexts', False), True)
-        else:
-            return Embedding(path + '.words', True)
+import os
+import sys
+
+from embedding import SVDEmbedding, EnsembleEmbedding, Embedding
+from matrix_serializer import is_normalized_embedding, is_word2vec_binary
+from explicit import PositiveExplicit
+from representation_cache import RepresentationCache
+
+
+def create_representation(args):
+    rep_type = args['<representation>']
+    path = args['<representation_path>']
+    neg = int(args['--neg'])
+    w_c = args['--w+c']
+    eig = float(args['--eig'])
+    mmap = args['--mmap']
+    
+    if args['--cache'] is None:
+        return build_representation(rep_type, path, neg, w_c, eig, mmap)
+    cache = RepresentationCache(os.path.expanduser(args['--cache']), int(args['--cache-mb']) * 1024 * 1024)
+    return cache.load(rep_type, path, neg, eig, w_c, mmap, lambda: build_representation(rep_type, path, neg, w_c, eig, mmap))
+
+
+def build_representation(rep_type, path, neg, w_c, eig, mmap):
+    if mmap and rep_type != 'PPMI' and not maps_as_is(rep_type, path, w_c):
+        print >>sys.stderr, 'Warning: --mmap only maps the files; the representation is still built in memory, as ' \
+                            'it is weighted, ensembled, or normalized. Save it with embedding2numpy.py to map it as is.'
+    if rep_type == 'PPMI':
+        if w_c:
+            raise Exception('w+c is not implemented for PPMI.')
+        else:
+            return PositiveExplicit(path, True, neg)
+        
+    elif rep_type == 'SVD':
+        if w_c:
+            return EnsembleEmbedding(SVDEmbedding(path, False, eig, False, mmap),
+                                     SVDEmbedding(path, False, eig, True, mmap), True)
+        else:
+            return SVDEmbedding(path, True, eig, mmap=mmap)
+        
+    elif is_word2vec_binary(path):
+        if w_c:
+            raise Exception('w+c is not implemented for a single file in word2vec\'s binary format.')
+        else:
+            return Embedding(path, True)
+        
+    else:
+        if w_c:
+            return EnsembleEmbedding(Embedding(path + '.words', False, mmap),
+                                     Embedding(path + '.contexts', False, mmap), True)
+        else:
+            return Embedding(path + '.words', True, mmap)
+
+
+def maps_as_is(rep_type, path, w_c):
+    """
+    Whether a memory-mapped embedding is used without any copy: only a single SGNS matrix that is saved as normalized
+    (see embedding2numpy.py).
+    """
+    return rep_type != 'SVD' and not w_c and not is_word2vec_binary(path) and is_normalized_embedding(path + '.words')
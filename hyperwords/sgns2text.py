@@ -1,6 +1,7 @@
 from docopt import docopt
 
 from representations.embedding import Embedding, EnsembleEmbedding
+from representations.matrix_serializer import save_text_vectors, save_word2vec_binary
 
 
 def main():
@@ -9,21 +10,29 @@ def main():
         sgns2text.py [options] <sgns_path> <output_path>
     
     Options:
-        --w+c        Use ensemble of word and context vectors
+        --w+c            Use ensemble of word and context vectors
+        --precision NUM  Significant digits of the vector components (e.g. 8 for smaller files); by default, as many
+                         as reading them back exactly takes
+        --header         Start with a "rows dim" line, as in word2vec's textual format
+        --binary         Save in word2vec's binary format instead
     """)
     
     sgns_path = args['<sgns_path>']
     output_path = args['<output_path>']
     w_c = args['--w+c']
+    precision = int(args['--precision']) if args['--precision'] is not None else None
+    header = args['--header']
+    binary = args['--binary']
     
     if w_c:
         sgns = EnsembleEmbedding(Embedding(sgns_path + '.words', False), Embedding(sgns_path + '.contexts', False), True)
     else:
         sgns = Embedding(sgns_path + '.words', True)
     
-    with open(output_path, 'w') as f:
-        for i, w in enumerate(sgns.iw):
-            print >>f, w, ' '.join([str(x) for x in sgns.m[i]])
+    if binary:
+        save_word2vec_binary(output_path, sgns.m, sgns.iw)
+    else:
+        save_text_vectors(output_path, sgns.m, sgns.iw, precision, header)
 
 
 if __name__ == '__main__':
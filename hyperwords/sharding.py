@@ -0,0 +1,170 @@
+from cStringIO import StringIO
+from multiprocessing import Pool, Queue
+from Queue import Full
+import os
+
+from corpus_reader import clean_line, is_compressed, open_corpus, read_corpus
+
+
+# The queues that the workers of map_shards read the lines of a compressed corpus from, one per shard (see deal_lines),
+# and the index of the shard that the worker is reading.
+DEALT_LINES = None
+CURRENT_SHARD = None
+
+
+def shard_offsets(path, num_shards):
+    """
+    Splits a file into num_shards byte ranges that start and end at line boundaries.
+    Returns num_shards + 1 offsets; shard i spans [offsets[i], offsets[i+1]).
+    A compressed file cannot be split, so it is all in the first shard (and the others are empty).
+    """
+    size = os.path.getsize(path)
+    if is_compressed(path):
+        return [0] + [size] * num_shards
+    offsets = [0]
+    with open(path, 'rb') as f:
+        for i in xrange(1, num_shards):
+            position = size * i // num_shards
+            if position <= offsets[-1]:
+                offsets.append(offsets[-1])
+                continue
+            f.seek(position - 1)
+            f.readline()
+            offsets.append(min(f.tell(), size))
+    offsets.append(size)
+    return offsets
+
+
+def read_shard(path, start, end, clean=False):
+    """
+    Yields the lines of the file that start within [start, end), cleaned as by scripts/clean_corpus.sh if clean is set.
+    A compressed file is read whole by its first shard, unless map_shards deals its lines to the workers.
+    """
+    if is_compressed(path):
+        if DEALT_LINES is not None:
+            for line in read_dealt_lines(DEALT_LINES[CURRENT_SHARD]):
+                yield clean_line(line) if clean else line
+        elif start < end:
+            for line in read_corpus(path, clean):
+                yield line
+        return
+    with open(path) as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if position >= end:
+                break
+            position += len(line)
+            yield clean_line(line) if clean else line
+
+
+def shard_seed(index, seed=17):
+    """
+    The random seed of the index-th shard; the first shard uses the same seed as a single-process run.
+    """
+    return seed + index
+
+
+def map_shards(func, path, workers, *args):
+    """
+    Calls func(path, start, end, index, *args) for each of the file's shards in a pool of worker processes,
+    and yields the results in shard order as they arrive, so that callers can merge them one at a time.
+    A single worker runs in the calling process. A compressed file cannot be split, so the calling process decompresses
+    it once and deals its lines to the workers in chunks, round robin, so that each shard always gets the same lines.
+    """
+    offsets = shard_offsets(path, workers)
+    tasks = [(func, path, offsets[i], offsets[i + 1], i) + args for i in xrange(workers)]
+    if workers == 1:
+        yield call_shard(tasks[0])
+        return
+    if not is_compressed(path):
+        pool = Pool(workers)
+        try:
+            for result in pool.imap(call_shard, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+        return
+    lines = [Queue(2) for i in xrange(workers)]
+    pool = Pool(workers, initializer=share_lines, initargs=(lines,))
+    try:
+        results = [pool.apply_async(call_shard, (task,)) for task in tasks]
+        deal_lines(path, lines, results)
+        for result in results:
+            yield result.get()
+    finally:
+        pool.close()
+        pool.join()
+
+
+def share_lines(lines):
+    global DEALT_LINES
+    DEALT_LINES = lines
+
+
+def deal_lines(path, lines, results, chunk_size=1024 * 1024):
+    """
+    Decompresses the file and puts its lines in chunks of about chunk_size bytes on the shards' queues, chunk i on
+    queue i % len(lines), and then None on every queue to end it. Dealing stops early once a shard has failed (its
+    result raises the error).
+    """
+    try:
+        with open_corpus(path) as f:
+            for i, chunk in enumerate(line_chunks(f, chunk_size)):
+                if any(result.ready() for result in results):
+                    break
+                put_line_chunk(lines[i % len(lines)], chunk, results[i % len(lines)])
+    finally:
+        for queue, result in zip(lines, results):
+            put_line_chunk(queue, None, result)
+
+
+def put_line_chunk(queue, chunk, result):
+    """
+    Puts a chunk on a shard's queue, waiting for room unless the shard has stopped reading (failed).
+    """
+    while True:
+        try:
+            queue.put(chunk, timeout=1)
+            return
+        except Full:
+            if result.ready():
+                return
+
+
+def line_chunks(f, chunk_size):
+    """
+    Yields the contents of a file in chunks of about chunk_size bytes that end at line boundaries.
+    """
+    rest = ''
+    while True:
+        data = f.read(chunk_size)
+        if len(data) == 0:
+            break
+        end = data.rfind('\n') + 1
+        if end == 0:
+            rest += data
+            continue
+        yield rest + data[:end]
+        rest = data[end:]
+    if len(rest) > 0:
+        yield rest
+
+
+def read_dealt_lines(lines):
+    """
+    Yields the lines of the chunks that a worker takes from the queue, until it takes None.
+    """
+    while True:
+        chunk = lines.get()
+        if chunk is None:
+            return
+        for line in StringIO(chunk):
+            yield line
+
+
+def call_shard(task):
+    global CURRENT_SHARD
+    CURRENT_SHARD = task[4]
+    return task[0](*task[1:])
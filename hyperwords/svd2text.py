@@ -1,6 +1,7 @@
 from docopt import docopt
 
 from representations.embedding import EnsembleEmbedding, SVDEmbedding
+from representations.matrix_serializer import save_text_vectors, save_word2vec_binary
 
 
 def main():
@@ -9,23 +10,31 @@ def main():
         svd2text.py [options] <svd_path> <output_path>
     
     Options:
-        --w+c        Use ensemble of word and context vectors
-        --eig NUM    Weighted exponent of the eigenvalue matrix [default: 0.5]
+        --w+c            Use ensemble of word and context vectors
+        --eig NUM        Weighted exponent of the eigenvalue matrix [default: 0.5]
+        --precision NUM  Significant digits of the vector components (e.g. 8 for smaller files); by default, as many
+                         as reading them back exactly takes
+        --header         Start with a "rows dim" line, as in word2vec's textual format
+        --binary         Save in word2vec's binary format instead
     """)
     
     svd_path = args['<svd_path>']
     output_path = args['<output_path>']
     w_c = args['--w+c']
     eig = float(args['--eig'])
+    precision = int(args['--precision']) if args['--precision'] is not None else None
+    header = args['--header']
+    binary = args['--binary']
     
     if w_c:
         svd = EnsembleEmbedding(SVDEmbedding(svd_path, False, eig, False), SVDEmbedding(svd_path, False, eig, True), True)
     else:
         svd = SVDEmbedding(svd_path, True, eig)
     
-    with open(output_path, 'w') as f:
-        for i, w in enumerate(svd.iw):
-            print >>f, w, ' '.join([str(x) for x in svd.m[i]])
+    if binary:
+        save_word2vec_binary(output_path, svd.m, svd.iw)
+    else:
+        save_text_vectors(output_path, svd.m, svd.iw, precision, header)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+from glob import glob
+import os
+import time
+
+from docopt import docopt
+import numpy as np
+
+import analogy_eval
+import ws_eval
+from representations.embedding import SVDEmbedding
+from representations.explicit import PositiveExplicit
+from representations.matrix_serializer import save_vocabulary
+from truncated_svd import truncated_svd, reconstruction_error, SOLVERS
+
+
+def main():
+    args = docopt("""
+    Usage:
+        svd_report.py [options] <pmi_path> <output_path>
+
+    Options:
+        --dim NUM          Dimensionality of eigenvectors [default: 500]
+        --neg NUM          Number of negative samples; subtracts its log from PMI [default: 1]
+        --solvers LIST     Comma-separated SVD solvers to compare [default: sparsesvd,arpack,randomized]
+        --oversample NUM   Extra random directions of the randomized solver [default: 10]
+        --power NUM        Power iterations of the randomized solver [default: 2]
+        --eig NUM          Weighted exponent of the eigenvalue matrix [default: 0.5]
+        --testsets DIR     Directory with the ws and analogy testsets [default: testsets]
+    """)
+
+    pmi_path = args['<pmi_path>']
+    output_path = args['<output_path>']
+    dim = int(args['--dim'])
+    neg = int(args['--neg'])
+    solvers = args['--solvers'].split(',')
+    oversample = int(args['--oversample'])
+    power_iters = int(args['--power'])
+    eig = float(args['--eig'])
+    ws_paths = sorted(glob(os.path.join(args['--testsets'], 'ws', '*.txt')))
+    analogy_paths = sorted(glob(os.path.join(args['--testsets'], 'analogy', '*.txt')))
+
+    for solver in solvers:
+        if solver not in SOLVERS:
+            raise Exception('Unknown SVD solver: ' + solver)
+
+    explicit = PositiveExplicit(pmi_path, normalize=False, neg=neg)
+    ws_data = [(path, ws_eval.read_test_set(path)) for path in ws_paths]
+    analogy_data = [(path, analogy_eval.read_test_set(path)) for path in analogy_paths]
+
+    header = ['solver', 'seconds', 'error']
+    header += [os.path.basename(path) for path, data in ws_data]
+    header += [os.path.basename(path) + suffix for path, data in analogy_data for suffix in ['.add', '.mul']]
+    print '\t'.join(header)
+    for solver in solvers:
+        start = time.time()
+        ut, s, vt = truncated_svd(explicit.m, dim, solver, oversample, power_iters)
+        seconds = time.time() - start
+
+        solver_path = output_path + '.' + solver
+        np.save(solver_path + '.ut.npy', ut)
+        np.save(solver_path + '.s.npy', s)
+        np.save(solver_path + '.vt.npy', vt)
+        save_vocabulary(solver_path + '.words.vocab', explicit.iw)
+        save_vocabulary(solver_path + '.contexts.vocab', explicit.ic)
+
+        representation = SVDEmbedding(solver_path, True, eig)
+        row = [solver, '%0.1f' % seconds, '%0.4f' % reconstruction_error(explicit.m, s)]
+        row += ['%0.3f' % ws_eval.evaluate(representation, data) for path, data in ws_data]
+        for path, data in analogy_data:
+            row += ['%0.3f' % accuracy for accuracy in analogy_eval.evaluate(representation, data)]
+        print '\t'.join(row)
+
+
+if __name__ == '__main__':
+    main()
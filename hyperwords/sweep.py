@@ -0,0 +1,289 @@
+from glob import glob
+import hashlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+
+def main():
+    args = docopt("""
+    Usage:
+        sweep.py [options] <corpus> <output_dir>
+
+    Every option that takes a LIST accepts comma-separated values; the sweep covers their cartesian product.
+
+    Options:
+        --method LIST      Representations to build: ppmi, svd, and/or sgns [default: svd]
+        --thr LIST         The minimal word count for being in the vocabulary [default: 100]
+        --win LIST         Window size [default: 2]
+        --pos              Positional contexts
+        --dyn              Dynamic context windows
+        --sub LIST         Subsampling threshold [default: 0]
+        --del              Delete out-of-vocabulary and subsampled placeholders
+        --cds LIST         Context distribution smoothing [default: 1.0]
+        --dim LIST         Dimensionality of eigenvectors / embeddings [default: 500]
+        --neg LIST         Number of negative samples; subtracts its log from PMI [default: 1]
+        --eig LIST         Weighted exponent of the eigenvalue matrix [default: 0.5]
+        --w+c              Use ensemble of word and context vectors
+        --solver NAME      SVD solver: sparsesvd, arpack, or randomized [default: sparsesvd]
+        --eval             Evaluate every representation on the testsets
+        --testsets DIR     Directory with the ws and analogy testsets [default: testsets]
+        --cpus NUM         CPU budget: the stages running at once use at most this many cores [default: 1]
+        --mem NUM          Memory budget in megabytes for the stages running at once [default: 4096]
+        --stage-mem NUM    Memory estimate of a single stage in megabytes [default: 1024]
+        --sgns-cpu NUM     Threads of each word2vecf run [default: 1]
+        --dry-run          Print the stages that would run, without running them
+    """)
+
+    corpus = os.path.abspath(args['<corpus>'])
+    output_dir = os.path.abspath(args['<output_dir>'])
+    sweep = dict([(name, args['--' + name].split(',')) for name in ['method', 'thr', 'win', 'sub', 'cds', 'dim',
+                                                                       'neg', 'eig']])
+    flags = dict([(name, args['--' + name]) for name in ['pos', 'dyn', 'del', 'w+c']])
+    testsets = None
+    if args['--eval']:
+        testsets = (sorted(glob(os.path.join(args['--testsets'], 'ws', '*.txt'))),
+                    sorted(glob(os.path.join(args['--testsets'], 'analogy', '*.txt'))))
+    resources = {'stage_mem': int(args['--stage-mem']), 'sgns_cpu': int(args['--sgns-cpu'])}
+
+    for method in sweep['method']:
+        if method not in ['ppmi', 'svd', 'sgns']:
+            raise Exception('Unknown method: ' + method)
+
+    graph = Graph(output_dir)
+    configs = []
+    names = sorted(sweep.keys())
+    for values in itertools.product(*[sweep[name] for name in names]):
+        config = dict(zip(names, values))
+        config.update(flags)
+        config['solver'] = args['--solver']
+        artifacts = build_pipeline(graph, corpus, config, testsets, resources)
+        # Parameters that do not apply to a method (e.g. --eig of SGNS) yield the very same artifacts.
+        if sorted([stage.path for stage in artifacts.values()]) not in [sorted([stage.path for stage in other.values()])
+                                                                         for other_config, other in configs]:
+            configs.append((config, artifacts))
+
+    if args['--dry-run']:
+        for stage in graph.stages:
+            print '%s\t%s\t%s' % ('cached' if stage.done() else 'run', stage.path, stage.command)
+        return
+
+    run(graph.stages, int(args['--cpus']), int(args['--mem']))
+    with open(os.path.join(output_dir, 'sweep.json'), 'w') as f:
+        for config, artifacts in configs:
+            print >>f, json.dumps({'config': config, 'artifacts': dict([(name, stage.path) for name, stage
+                                                                        in artifacts.items()])}, sort_keys=True)
+    print os.path.join(output_dir, 'sweep.json')
+
+
+def build_pipeline(graph, corpus, config, testsets, resources):
+    """
+    Adds the stages of a single configuration to the graph, and returns them by name. Each stage only receives the
+    parameters that affect its output, so configurations that differ downstream share their upstream artifacts.
+    """
+    method = config['method']
+    python = sys.executable
+    hyperwords = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.dirname(hyperwords)
+
+    # The corpus is cleaned on the fly, so the pairs are the first artifact.
+    pairs_params = dict([(name, config[name]) for name in ['thr', 'win', 'sub', 'pos', 'dyn', 'del']])
+    pairs = graph.add('pairs', dict(pairs_params, corpus=file_identity(corpus)), [],
+                      '%s %s/corpus2pairs.py --clean %s %s > {out}/pairs' %
+                      (python, hyperwords, options(pairs_params), corpus),
+                      memory=resources['stage_mem'])
+    counts = graph.add('counts', {}, [pairs],
+                       '%s %s/pairs2counts.py --mem %d --tmp {out} {0}/pairs > {out}/counts && '
+                       '%s %s/counts2vocab.py {out}/counts' %
+                       (python, hyperwords, resources['stage_mem'], python, hyperwords),
+                       memory=resources['stage_mem'])
+    artifacts = {'pairs': pairs, 'counts': counts}
+
+    if method in ['ppmi', 'svd']:
+        artifacts['pmi'] = graph.add('pmi', {'cds': config['cds']}, [counts],
+                                     '%s %s/counts2pmi.py --cds %s {0}/counts {out}/pmi' %
+                                     (python, hyperwords, config['cds']),
+                                     memory=resources['stage_mem'])
+    if method == 'ppmi':
+        representation = {'type': 'PPMI', 'path': '{0}/pmi', 'neg': int(config['neg'])}
+        evaluated = artifacts['pmi']
+    elif method == 'svd':
+        artifacts['svd'] = graph.add('svd', {'dim': config['dim'], 'neg': config['neg'], 'solver': config['solver']},
+                                     [artifacts['pmi']],
+                                     '%s %s/pmi2svd.py --dim %s --neg %s --solver %s {0}/pmi {out}/svd' %
+                                     (python, hyperwords, config['dim'], config['neg'], config['solver']),
+                                     memory=resources['stage_mem'])
+        text_params = {'eig': config['eig'], 'w+c': config['w+c']}
+        artifacts['text'] = graph.add('svd2text', text_params, [artifacts['svd']],
+                                      '%s %s/svd2text.py %s {0}/svd {out}/vectors.txt' %
+                                      (python, hyperwords, options(text_params)))
+        representation = {'type': 'SVD', 'path': '{0}/svd', 'eig': float(config['eig']), 'w+c': config['w+c']}
+        evaluated = artifacts['svd']
+    else:
+        word2vecf = os.path.join(root, 'word2vecf', 'word2vecf')
+        artifacts['sgns'] = graph.add('sgns', {'dim': config['dim'], 'neg': config['neg'], 'cds': config['cds']},
+                                      [pairs, counts],
+                                      '%s -train {0}/pairs -pow %s -size %s -negative %s -threads %d '
+                                      '-cvocab {1}/counts.contexts.vocab -wvocab {1}/counts.words.vocab '
+                                      '-dumpcv {out}/sgns.contexts -output {out}/sgns.words && '
+                                      '%s %s/text2numpy.py {out}/sgns.words && '
+                                      '%s %s/text2numpy.py {out}/sgns.contexts' %
+                                      (word2vecf, config['cds'], config['dim'], config['neg'], resources['sgns_cpu'],
+                                       python, hyperwords, python, hyperwords),
+                                      cpus=resources['sgns_cpu'])
+        text_params = {'w+c': config['w+c']}
+        artifacts['text'] = graph.add('sgns2text', text_params, [artifacts['sgns']],
+                                      '%s %s/sgns2text.py %s {0}/sgns {out}/vectors.txt' %
+                                      (python, hyperwords, options(text_params)))
+        representation = {'type': 'SGNS', 'path': '{0}/sgns', 'w+c': config['w+c']}
+        evaluated = artifacts['sgns']
+
+    if testsets is not None:
+        ws_paths, analogy_paths = testsets
+        representation['path'] = representation['path'].format(evaluated.path)
+        manifest = {'representations': [representation],
+                    'ws': [os.path.abspath(path) for path in ws_paths],
+                    'analogy': [os.path.abspath(path) for path in analogy_paths]}
+        identity = dict([(key, value) for key, value in representation.items() if key != 'path'])
+        identity['testsets'] = [file_identity(path) for path in manifest['ws'] + manifest['analogy']]
+        artifacts['eval'] = graph.add('eval', identity, [evaluated],
+                                      '%s %s/eval_harness.py {out}/manifest.json > {out}/results.csv' %
+                                      (python, hyperwords),
+                                      files={'manifest.json': json.dumps(manifest, sort_keys=True)},
+                                      memory=resources['stage_mem'])
+    return artifacts
+
+
+def options(params):
+    """
+    The command-line options of the script a stage runs: flags are passed when set, other parameters always.
+    """
+    args = []
+    for name in sorted(params):
+        value = params[name]
+        if value is True:
+            args.append('--' + name)
+        elif value is not False:
+            args.append('--%s %s' % (name, value))
+    return ' '.join(args)
+
+
+def file_identity(path):
+    stat = os.stat(path)
+    return '%s %d %r' % (path, stat.st_size, stat.st_mtime)
+
+
+class Graph:
+    """
+    The stages of a sweep, deduplicated by key and in topological order (a stage is added after its inputs).
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.stages = []
+        self.keys = {}
+
+    def add(self, name, params, inputs, command, cpus=1, memory=0, files=None):
+        stage = Stage(self.output_dir, name, params, inputs, command, cpus, memory, files)
+        if stage.key not in self.keys:
+            self.keys[stage.key] = stage
+            self.stages.append(stage)
+        return self.keys[stage.key]
+
+
+class Stage:
+    """
+    A step of the pipeline: a shell command that reads the artifacts of its input stages ({0}, {1}, ...) and writes
+    its own artifact into a directory ({out}). The artifact is keyed by the stage name, the parameters that affect it,
+    and the keys of its inputs, and lives in output_dir/name/key. A stage is run in a staging directory that is
+    renamed when the command succeeds, so an existing artifact directory is always complete.
+    """
+
+    def __init__(self, output_dir, name, params, inputs, command, cpus=1, memory=0, files=None):
+        identity = [name] + ['%s=%r' % (param, params[param]) for param in sorted(params)]
+        identity += [stage.key for stage in inputs]
+        self.key = hashlib.sha1('\n'.join(identity)).hexdigest()
+        self.name = name
+        self.params = params
+        self.inputs = inputs
+        self.directory = os.path.join(output_dir, name)
+        self.path = os.path.join(self.directory, self.key)
+        self.command = command.format(*[stage.path for stage in inputs], out=self.path)
+        self.cpus = cpus
+        self.memory = memory
+        self.files = files or {}
+
+    def done(self):
+        return os.path.exists(self.path)
+
+    def start(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.staging = tempfile.mkdtemp(prefix='.staging.', dir=self.directory)
+        for name, content in self.files.items():
+            with open(os.path.join(self.staging, name), 'w') as f:
+                f.write(content)
+        command = self.command.replace(self.path, self.staging)
+        with open(os.path.join(self.staging, 'params.json'), 'w') as f:
+            json.dump({'stage': self.name, 'params': self.params, 'inputs': [stage.path for stage in self.inputs],
+                       'command': self.command}, f, sort_keys=True)
+        self.log = open(os.path.join(self.staging, 'log'), 'w')
+        self.started = time.time()
+        self.process = subprocess.Popen(command, shell=True, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def finish(self):
+        """
+        Collects the finished command: publishes the artifact, or raises (keeping the staging directory for its log).
+        """
+        self.log.close()
+        if self.process.returncode != 0:
+            raise Exception('Stage %s failed (exit code %d); see %s' %
+                            (self.name, self.process.returncode, os.path.join(self.staging, 'log')))
+        os.rename(self.staging, self.path)
+
+
+def run(stages, cpus, memory):
+    """
+    Runs the stages whose artifacts do not exist yet, as soon as their inputs are done and they fit in the CPU and
+    memory budgets (a stage that exceeds a budget on its own runs alone). After a failure, no new stage is started;
+    the running ones are waited for, and the first failure is raised.
+    """
+    pending = [stage for stage in stages if not stage.done()]
+    for stage in stages:
+        if stage.done():
+            print >>sys.stderr, 'cached\t%s\t%s' % (stage.name, stage.path)
+    running = []
+    failure = None
+    while running or (pending and failure is None):
+        if failure is None:
+            for stage in list(pending):
+                used_cpus = sum([other.cpus for other in running])
+                used_memory = sum([other.memory for other in running])
+                fits = used_cpus + stage.cpus <= cpus and used_memory + stage.memory <= memory
+                if all([other.done() for other in stage.inputs]) and (fits or not running):
+                    print >>sys.stderr, 'start\t%s\t%s' % (stage.name, stage.path)
+                    stage.start()
+                    pending.remove(stage)
+                    running.append(stage)
+        time.sleep(0.1)
+        for stage in list(running):
+            if stage.process.poll() is None:
+                continue
+            running.remove(stage)
+            try:
+                stage.finish()
+                print >>sys.stderr, 'done\t%s\t%s\t%.1fs' % (stage.name, stage.path, time.time() - stage.started)
+            except Exception as e:
+                failure = failure or e
+    if failure is not None:
+        raise failure
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 from docopt import docopt
-import numpy as np
 
-from representations.matrix_serializer import save_vocabulary
+from representations.matrix_serializer import save_embedding, load_text_vectors, is_word2vec_binary, \
+    load_word2vec_binary
 
 
 def main():
@@ -12,29 +12,11 @@ def main():
     
     path = args['<path>']
     
-    matrix = read_vectors(path)
-    iw = sorted(matrix.keys())
-    
-    new_matrix = np.zeros(shape=(len(iw), len(matrix[iw[0]])), dtype=np.float32)
-    for i, word in enumerate(iw):
-        if word in matrix:
-            new_matrix[i, :] = matrix[word]
-    
-    np.save(path + '.npy', new_matrix)
-    save_vocabulary(path + '.vocab', iw)
-
-
-def read_vectors(path):
-    vectors = {}
-    with open(path) as f:
-        first_line = True
-        for line in f:
-            if first_line:
-                first_line = False
-                continue
-            tokens = line.strip().split(' ')
-            vectors[tokens[0]] = np.asarray([float(x) for x in tokens[1:]])
-    return vectors
+    if is_word2vec_binary(path):
+        m, iw = load_word2vec_binary(path)
+    else:
+        m, iw = load_text_vectors(path)
+    save_embedding(path, m, iw)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,92 @@
+import numpy as np
+from scipy.sparse.linalg import svds
+
+
+def truncated_svd(m, dim, solver='sparsesvd', oversample=10, power_iters=2, seed=17):
+    """
+    Factorizes a sparse matrix into its top dim singular triplets, in the layout of sparsesvd:
+    ut (dim x rows), s (dim, descending), and vt (dim x columns).
+    """
+    if solver == 'sparsesvd':
+        return sparsesvd_svd(m, dim)
+    elif solver == 'arpack':
+        return arpack_svd(m, dim)
+    elif solver == 'randomized':
+        return randomized_svd(m, dim, oversample, power_iters, seed)
+    else:
+        raise Exception('Unknown SVD solver: ' + solver)
+
+
+SOLVERS = ['sparsesvd', 'arpack', 'randomized']
+
+
+def sparsesvd_svd(m, dim):
+    """
+    SVDLIBC (single-threaded Lanczos) through the sparsesvd package.
+    """
+    from sparsesvd import sparsesvd
+    return sparsesvd(m.tocsc(), dim)
+
+
+def arpack_svd(m, dim):
+    """
+    ARPACK (implicitly restarted Lanczos) through scipy. It returns the singular values in ascending order.
+    """
+    u, s, vt = svds(m, dim)
+    order = np.argsort(-s)
+    return u[:, order].T, s[order], vt[order]
+
+
+def randomized_svd(m, dim, oversample=10, power_iters=2, seed=17):
+    """
+    Randomized range finder (Halko, Martinsson, and Tropp, 2011): projects the matrix on dim + oversample random
+    directions, sharpens the basis with power_iters power iterations, and solves a small dense SVD. All the heavy
+    lifting is sparse-dense products and QR factorizations, which run on (multithreaded) BLAS.
+    The matrix is only touched through products, one pass each, so a ShardedMatrix is streamed block by block and
+    the memory is O((rows + columns) * (dim + oversample)) rather than O(nnz).
+    """
+    rank = min(dim + oversample, min(m.shape))
+    omega = np.random.RandomState(seed).standard_normal((m.shape[1], rank))
+    q, _ = np.linalg.qr(block_dot(m, omega))
+    for i in xrange(power_iters):
+        q, _ = np.linalg.qr(block_transpose_dot(m, q))
+        q, _ = np.linalg.qr(block_dot(m, q))
+    b = block_transpose_dot(m, q).T
+    ub, s, vt = np.linalg.svd(b, full_matrices=False)
+    ut = ub[:, :dim].T.dot(q.T)
+    return ut, s[:dim], vt[:dim]
+
+
+def row_blocks(m):
+    """
+    The (start row, block) pairs of a ShardedMatrix, or the whole matrix as a single block.
+    """
+    if hasattr(m, 'iter_blocks'):
+        return m.iter_blocks()
+    return [(0, m)]
+
+
+def block_dot(m, x):
+    """
+    m * x for a dense x, computed one block of rows at a time.
+    """
+    return np.vstack([np.asarray(block.dot(x)) for start, block in row_blocks(m)])
+
+
+def block_transpose_dot(m, x):
+    """
+    m.T * x for a dense x, accumulated one block of rows at a time.
+    """
+    result = np.zeros((m.shape[1], x.shape[1]))
+    for start, block in row_blocks(m):
+        result += block.T.dot(x[start:start + block.shape[0]])
+    return result
+
+
+def reconstruction_error(m, s):
+    """
+    The relative Frobenius error of the rank-len(s) reconstruction from its singular values.
+    Holds whenever the factors are orthonormal and s are the singular values of the projected matrix.
+    """
+    squared_norm = float(m.multiply(m).sum())
+    return np.sqrt(max(0.0, squared_norm - float(np.sum(np.square(s.astype(np.float64))))) / squared_norm)
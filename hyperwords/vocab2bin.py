@@ -0,0 +1,27 @@
+from docopt import docopt
+
+from representations.matrix_serializer import save_binary_vocabulary
+
+
+def main():
+    args = docopt("""
+    Usage:
+        vocab2bin.py [options] <vocab_path>...
+
+    Options:
+        --counts     The vocabularies are count vocabularies (word count per line)
+    """)
+
+    for path in args['<vocab_path>']:
+        if args['--counts']:
+            with open(path) as f:
+                vocab = [line.strip().split() for line in f if len(line) > 0]
+            save_binary_vocabulary(path, [w for w, c in vocab], [int(c) for w, c in vocab])
+        else:
+            with open(path) as f:
+                vocab = [line.strip() for line in f if len(line) > 0]
+            save_binary_vocabulary(path, vocab)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,46 @@
-from docopt import docopt
-from scipy.stats.stats import spearmanr
-
-from representations.representation_factory import create_representation
-
-
-def main():
-    args = docopt("""
-    Usage:
-        ws_eval.py [options] <representation> <representation_path> <task_path>
-    
-    Options:
-        --neg NUM    Number of negative samples; subtracts its log from PMI (only applicable to PPMI) [default: 1]
-        --w+c        Use ensemble of word and context vectors (not applicable to PPMI)
-        --eig NUM    Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
-    """)
-    
-    data = read_test_set(args['<task_path>'])
-    representation = create_representation(args)
-    correlation = evaluate(representation, data)
-    print args['<representation>'], args['<representation_path>'], '\t%0.3f' % correlation
-
-
-def read_test_set(path):
-    test = []
-    with open(path) as f:
-        for line in f:
-            x, y, sim = line.strip().lower().split()
-            test.append(((x, y), sim))
-    return test 
-
-
-def evaluate(representation, data):
-    results = []
-    for (x, y), sim in data:
-        results.append((representation.similarity(x, y), sim))
-    actual, expected = zip(*results)
-    return spearmanr(actual, expected)[0]
-
-
-if __name__ == '__main__':
-    main()
+from docopt import docopt
+from scipy.stats.stats import spearmanr
+
+from representations.representation_factory import create_representation
+
+
+def main():
+    args = docopt("""
+    Usage:
+        ws_eval.py [options] <representation> <representation_path> <task_path>...
+    
+    Options:
+        --neg NUM       Number of negative samples; subtracts its log from PMI (only applicable to PPMI) [default: 1]
+        --w+c           Use ensemble of word and context vectors (not applicable to PPMI)
+        --eig NUM       Weighted exponent of the eigenvalue matrix (only applicable to SVD) [default: 0.5]
+        --mmap          Memory-map the embedding instead of reading it (not applicable to PPMI)
+        --cache DIR     Cache the built representations in DIR (e.g. ~/.cache/hyperwords), for later runs to reuse
+        --cache-mb NUM  Size limit of the cache in megabytes; least recently used entries are evicted [default: 4096]
+    """)
+    
+    representation = create_representation(args)
+    for task_path in args['<task_path>']:
+        correlation = evaluate(representation, read_test_set(task_path))
+        print '\t'.join([args['<representation>'], args['<representation_path>'], task_path, '%0.3f' % correlation])
+
+
+def read_test_set(path):
+    test = []
+    with open(path) as f:
+        for line in f:
+            x, y, sim = line.strip().lower().split()
+            test.append(((x, y), sim))
+    return test 
+
+
+def evaluate(representation, data):
+    """
+    Scores all the pairs at once (see similarity_batch) and correlates the scores with the human ones.
+    """
+    pairs, expected = zip(*data)
+    actual = representation.similarity_batch([x for x, y in pairs], [y for x, y in pairs])
+    return spearmanr(actual, expected)[0]
+
+
+if __name__ == '__main__':
+    main()
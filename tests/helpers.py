@@ -0,0 +1,55 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HYPERWORDS = os.path.join(ROOT, 'hyperwords')
+SCRIPTS = os.path.join(ROOT, 'scripts')
+sys.path.insert(0, HYPERWORDS)
+
+
+def write_corpus(path, num_lines=300, seed=17):
+    """
+    Writes a tiny corpus of lines of 1 to 15 words with a long-tailed (geometric) distribution.
+    """
+    rnd = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in xrange(num_lines):
+            f.write(' '.join(['w%d' % int(rnd.expovariate(0.1)) for j in xrange(rnd.randint(1, 15))]) + '\n')
+
+
+def parse_counts(text):
+    """
+    Parses textual counts (count word context per line, as written by hyperwords or by sort | uniq -c) into a Counter.
+    """
+    counts = Counter()
+    for line in text.splitlines():
+        n, w, c = line.split()
+        counts[(w, c)] += int(n)
+    return counts
+
+
+class ScriptTestCase(unittest.TestCase):
+    """
+    Runs the programs of hyperwords (and its shell scripts) in a fresh temporary directory.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='hyperwords.tests.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def run_script(self, name, *args):
+        return subprocess.check_output([sys.executable, os.path.join(HYPERWORDS, name)] + list(args), cwd=self.tmp)
+
+    def run_shell(self, name, *args):
+        return subprocess.check_output(['sh', os.path.join(SCRIPTS, name)] + list(args), cwd=self.tmp)
@@ -0,0 +1,74 @@
+import bz2
+import gzip
+import random
+import subprocess
+import unittest
+from distutils.spawn import find_executable
+
+from helpers import ScriptTestCase, parse_counts
+from corpus_reader import read_corpus
+
+PUNCTUATION = ['.', ',', '!', '?', '"', "'", '(', ')', '[', ']', '-', '_', '/', '\\', '\xe2\x80\x94', '\xff', '\x85']
+WHITESPACE = [' ', ' ', ' ', '  ', '\t', '\r', '\f', '\v']
+
+
+def write_messy_corpus(path, num_lines=500, seed=17):
+    """
+    Writes a corpus that needs cleaning: capitalized words, non-ASCII letters, invalid UTF-8, punctuation around and
+    inside words, runs of mixed whitespace, and CRLF line ends.
+    """
+    rnd = random.Random(seed)
+    with open(path, 'wb') as f:
+        for i in xrange(num_lines):
+            tokens = []
+            for j in xrange(rnd.randint(0, 12)):
+                word = 'w%d' % int(rnd.expovariate(0.2))
+                if rnd.random() < 0.2:
+                    word = word.upper()
+                if rnd.random() < 0.1:
+                    word = word[:1] + rnd.choice(['\xc3\xa9', '\xff', '-']) + word[1:]
+                prefix = ''.join([rnd.choice(PUNCTUATION) for k in xrange(int(rnd.expovariate(2)))])
+                suffix = ''.join([rnd.choice(PUNCTUATION) for k in xrange(int(rnd.expovariate(2)))])
+                tokens.append(rnd.choice(WHITESPACE) + prefix + word + suffix)
+            f.write(''.join(tokens) + rnd.choice(['', '', ' ', '.', '\r']) + '\n')
+
+
+class CleanCorpusTest(ScriptTestCase):
+    """
+    Cleaning on the fly (read_corpus and corpus2counts.py --clean) gives what scripts/clean_corpus.sh outputs, also
+    for compressed corpora.
+    """
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+        write_messy_corpus(self.path('corpus'))
+        self.expected = self.run_shell('clean_corpus.sh', 'corpus')
+        with open(self.path('clean'), 'wb') as f:
+            f.write(self.expected)
+        with open(self.path('corpus'), 'rb') as f:
+            text = f.read()
+        for name, opener in [('corpus.gz', gzip.open), ('corpus.bz2', bz2.BZ2File)]:
+            f = opener(self.path(name), 'wb')
+            f.write(text)
+            f.close()
+        self.compressed = ['corpus.gz', 'corpus.bz2']
+        if find_executable('xz') is not None:
+            subprocess.check_call(['xz', '-k', 'corpus'], cwd=self.tmp)
+            self.compressed.append('corpus.xz')
+
+    def test_read_corpus(self):
+        for name in ['corpus'] + self.compressed:
+            self.assertEqual(''.join(read_corpus(self.path(name), clean=True)), self.expected)
+
+    def test_corpus2counts(self):
+        expected = parse_counts(self.run_script('corpus2counts.py', '--thr', '3', '--win', '2', 'clean'))
+        self.assertTrue(len(expected) > 0)
+        for name in ['corpus'] + self.compressed:
+            for workers in ['1', '3']:
+                counts = self.run_script('corpus2counts.py', '--thr', '3', '--win', '2', '--clean', '--workers',
+                                         workers, name)
+                self.assertEqual(parse_counts(counts), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from helpers import ScriptTestCase, parse_counts, write_corpus
+
+
+class CountsTest(ScriptTestCase):
+    """
+    Counting over integer ids (corpus2counts.py) gives the counts of the original pipeline: corpus2pairs.py, then
+    scripts/pairs2counts.sh.
+    """
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+        write_corpus(self.path('corpus'))
+        with open(self.path('pairs'), 'w') as f:
+            f.write(self.run_script('corpus2pairs.py', '--thr', '3', '--win', '3', 'corpus'))
+        self.expected = parse_counts(self.run_shell('pairs2counts.sh', 'pairs'))
+
+    def test_corpus2counts(self):
+        counts = parse_counts(self.run_script('corpus2counts.py', '--thr', '3', '--win', '3', 'corpus'))
+        self.assertEqual(counts, self.expected)
+
+    def test_corpus2counts_workers(self):
+        counts = parse_counts(self.run_script('corpus2counts.py', '--thr', '3', '--win', '3', '--workers', '3',
+                                              'corpus'))
+        self.assertEqual(counts, self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import random
+import unittest
+
+import numpy as np
+
+from helpers import ScriptTestCase, parse_counts
+from ngram2counts import sample_keep_patterns, window_reach
+
+
+def write_ngrams(path, replay_path, num_ngrams=200, seed=17):
+    """
+    Writes n-grams (of 1 to 5 words, some capitalized) in Google's format, and the corpus that replays them: every
+    n-gram, lowercased, on match_count lines.
+    """
+    rnd = random.Random(seed)
+    with open(path, 'w') as f, open(replay_path, 'w') as replay:
+        for i in xrange(num_ngrams):
+            words = ['w%d' % int(rnd.expovariate(0.2)) for j in xrange(rnd.randint(1, 5))]
+            words = [w.upper() if rnd.random() < 0.1 else w for w in words]
+            match_count = rnd.randint(1, 100)
+            f.write('%s\t%d\t%d\t%d\n' % (' '.join(words), 1990, match_count, 1))
+            replay.write((' '.join(words).lower() + '\n') * match_count)
+
+
+class NgramsToCountsTest(ScriptTestCase):
+    """
+    Counting every n-gram once, weighted by its match count, gives exactly the counts of replaying its occurrences
+    (corpus2pairs.py and scripts/pairs2counts.sh over a corpus that repeats each n-gram match_count times), and, with
+    subsampling and dynamic windows, the same counts in expectation.
+    """
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+        write_ngrams(self.path('ngrams'), self.path('replay'))
+
+    def replay_counts(self, options):
+        with open(self.path('pairs'), 'w') as f:
+            f.write(self.run_script('corpus2pairs.py', *(options + ['replay'])))
+        return parse_counts(self.run_shell('pairs2counts.sh', 'pairs'))
+
+    def test_weighted_counts(self):
+        for options in [['--thr', '50', '--win', '3'], ['--thr', '50', '--win', '3', '--del']]:
+            counts = parse_counts(self.run_script('ngram2counts.py', *(options + ['ngrams'])))
+            self.assertEqual(counts, self.replay_counts(options))
+
+    def test_sampled_counts(self):
+        options = ['--thr', '50', '--win', '3', '--sub', '1e-2', '--dyn', '--del']
+        counts = parse_counts(self.run_script('ngram2counts.py', *(options + ['ngrams'])))
+        expected = self.replay_counts(options)
+        total = float(sum(expected.values()))
+        self.assertTrue(abs(sum(counts.values()) - total) < 0.02 * total)
+        frequent = [pair for pair, n in expected.most_common(20)]
+        self.assertTrue(abs(sum([counts[pair] for pair in frequent]) - sum([expected[pair] for pair in frequent])) <
+                        0.05 * sum([expected[pair] for pair in frequent]))
+
+
+class SamplersTest(unittest.TestCase):
+    """
+    The binomial chains draw the outcomes of many occurrences at once with the right distribution.
+    """
+
+    def test_sample_keep_patterns(self):
+        rnd = np.random.RandomState(17)
+        keep = np.array([0.3, 0.9, 1.0, 0.5, 1.0])
+        for tokens, weight in [([0, 1, 3], 1000000), ([2, 0, 0], 400000), ([4, 1], 7)]:
+            patterns, pattern_weights = sample_keep_patterns(np.array([tokens]), np.array([weight]), keep, rnd)
+            # Every occurrence keeps exactly one subset of the tokens, and the rest are -1.
+            self.assertEqual(pattern_weights.sum(), weight)
+            self.assertTrue(np.all((patterns == tokens) | (patterns == -1)))
+            self.assertEqual(len(set(map(tuple, patterns.tolist()))), len(patterns))
+            # Each token is kept with its probability, and independently of the others.
+            for j in xrange(len(tokens)):
+                self.assert_binomial(pattern_weights[patterns[:, j] >= 0].sum(), weight, keep[tokens[j]])
+            both = (patterns[:, 0] >= 0) & (patterns[:, 1] >= 0)
+            self.assert_binomial(pattern_weights[both].sum(), weight, keep[tokens[0]] * keep[tokens[1]])
+
+    def test_window_reach(self):
+        rnd = np.random.RandomState(17)
+        win = 4
+        weights = np.array([1000000, 0, 7, 250000])
+        reach = window_reach(weights, win, rnd)
+        self.assertTrue(np.array_equal(reach[:, 0], weights))
+        self.assertTrue(np.all(np.diff(reach, axis=1) <= 0))
+        for d in xrange(1, win + 1):
+            for n, weight in zip(reach[:, d - 1], weights):
+                self.assert_binomial(n, weight, float(win - d + 1) / win)
+
+    def assert_binomial(self, n, trials, p):
+        """
+        n is within 6 standard deviations of a binomial's mean.
+        """
+        self.assertTrue(abs(n - trials * p) <= 6 * np.sqrt(trials * p * (1 - p)), (n, trials, p))
+
+
+if __name__ == '__main__':
+    unittest.main()
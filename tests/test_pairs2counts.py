@@ -0,0 +1,66 @@
+import unittest
+from collections import Counter
+from StringIO import StringIO
+
+from helpers import ScriptTestCase, parse_counts, write_corpus
+from cooccurrence import CooccurrenceCounter, write_counts
+from pairs2counts import count_pairs, invert
+
+
+class PairsToCountsTest(ScriptTestCase):
+    """
+    pairs2counts.py aggregates pairs as scripts/pairs2counts.sh (sort | uniq -c) does, also when its memory budget
+    forces it to spill sorted runs to disk and merge them.
+    """
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+        write_corpus(self.path('corpus'))
+        with open(self.path('pairs'), 'w') as f:
+            f.write(self.run_script('corpus2pairs.py', '--thr', '3', '--win', '3', '--dyn', 'corpus'))
+        self.expected = parse_counts(self.run_shell('pairs2counts.sh', 'pairs'))
+
+    def test_pairs2counts(self):
+        self.assertEqual(parse_counts(self.run_script('pairs2counts.py', 'pairs')), self.expected)
+
+    def test_spilled_runs(self):
+        wi = {}
+        ci = {}
+        # A budget of a few hundred pairs, and blocks of 100 lines, so that the counts are spilled many times.
+        counts = CooccurrenceCounter(2 ** 20, 2 ** 20, memory=8000, tmp_dir=self.tmp)
+        try:
+            with open(self.path('pairs')) as f:
+                count_pairs(counts, f, wi, ci, block_size=100)
+            self.assertTrue(len(counts.runs) > 1)
+            iw = invert(wi)
+            ic = invert(ci)
+            aggregated = Counter()
+            previous = None
+            for words, contexts, block_counts in counts.iter_items(block_size=50):
+                for w, c, n in zip(words.tolist(), contexts.tolist(), block_counts.tolist()):
+                    # Merged blocks are sorted and never repeat a pair.
+                    self.assertTrue(previous is None or (w, c) > previous)
+                    previous = (w, c)
+                    aggregated[(iw[w], ic[c])] += n
+        finally:
+            counts.close()
+        self.assertEqual(aggregated, self.expected)
+
+    def test_whole_blocks(self):
+        # A last block that is exactly full once left an empty block, whose keys came out as floats.
+        with open(self.path('pairs')) as f:
+            lines = f.readlines()
+        for block_size in [len(lines), len(lines) // 4]:
+            pairs = lines[:block_size * (len(lines) // block_size)]
+            wi = {}
+            ci = {}
+            counts = CooccurrenceCounter(2 ** 20, 2 ** 20)
+            count_pairs(counts, pairs, wi, ci, block_size=block_size)
+            counts.update([], [])
+            f = StringIO()
+            write_counts(f, counts, invert(wi), invert(ci))
+            self.assertEqual(parse_counts(f.getvalue()), Counter([tuple(line.split()) for line in pairs]))
+
+
+if __name__ == '__main__':
+    unittest.main()
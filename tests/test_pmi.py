@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from helpers import ScriptTestCase, write_corpus
+from representations.matrix_serializer import load_matrix
+
+
+class CorpusToPMITest(ScriptTestCase):
+    """
+    corpus2pmi.py gives the PMI matrix (and the pairs) of the original pipeline: corpus2pairs.py,
+    scripts/pairs2counts.sh, counts2vocab.py, and counts2pmi.py.
+    """
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+        write_corpus(self.path('corpus'))
+
+    def assert_same_pmi(self, options):
+        with open(self.path('pairs'), 'w') as f:
+            f.write(self.run_script('corpus2pairs.py', *(options + ['corpus'])))
+        with open(self.path('counts'), 'w') as f:
+            f.write(self.run_shell('pairs2counts.sh', 'pairs'))
+        self.run_script('counts2vocab.py', 'counts')
+        self.run_script('counts2pmi.py', '--cds', '0.75', 'counts', 'pmi')
+        self.run_script('corpus2pmi.py', '--cds', '0.75', '--pairs', 'fused.pairs', *(options + ['corpus', 'fused']))
+
+        for suffix in ['.words.vocab', '.contexts.vocab']:
+            self.assertEqual(read(self.path('fused' + suffix)), read(self.path('pmi' + suffix)))
+        self.assertEqual(read(self.path('fused.pairs')), read(self.path('pairs')))
+        expected = load_matrix(self.path('pmi.npz'))
+        pmi = load_matrix(self.path('fused.npz'))
+        self.assertEqual(pmi.shape, expected.shape)
+        self.assertTrue(np.array_equal(pmi.indptr, expected.indptr))
+        self.assertTrue(np.array_equal(pmi.indices, expected.indices))
+        self.assertTrue(np.allclose(pmi.data, expected.data, rtol=1e-6))
+
+    def test_window(self):
+        self.assert_same_pmi(['--thr', '3', '--win', '2'])
+
+    def test_subsampling_dynamic_windows(self):
+        self.assert_same_pmi(['--thr', '3', '--win', '3', '--sub', '1e-2', '--dyn', '--del'])
+
+    def test_positional_contexts(self):
+        self.assert_same_pmi(['--thr', '3', '--win', '2', '--pos'])
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import gzip
+import unittest
+from cStringIO import StringIO
+from functools import partial
+
+from helpers import ScriptTestCase, write_corpus
+import sharding
+from sharding import line_chunks, map_shards, read_shard
+
+
+def shard_lines(path, start, end, index):
+    return list(read_shard(path, start, end))
+
+
+class DealtShardsTest(ScriptTestCase):
+    """
+    The lines of a compressed corpus are dealt to the workers round robin, so every shard always gets the same lines,
+    and sampling with several workers is as reproducible as on plain text.
+    """
+
+    def write_compressed_corpus(self, num_lines):
+        write_corpus(self.path('corpus'), num_lines)
+        with open(self.path('corpus')) as f:
+            text = f.read()
+        f = gzip.open(self.path('corpus.gz'), 'wb')
+        f.write(text)
+        f.close()
+        return text
+
+    def test_round_robin(self):
+        text = self.write_compressed_corpus(2000)
+        chunks = list(line_chunks(StringIO(text), 1000))
+        deal_lines = sharding.deal_lines
+        sharding.deal_lines = partial(deal_lines, chunk_size=1000)
+        try:
+            shards = list(map_shards(shard_lines, self.path('corpus.gz'), 3))
+        finally:
+            sharding.deal_lines = deal_lines
+        self.assertEqual(shards, [StringIO(''.join(chunks[i::3])).readlines() for i in xrange(3)])
+
+    def test_reproducible_sampling(self):
+        # Large enough for several chunks of about 1MB.
+        self.write_compressed_corpus(80000)
+        options = ['--thr', '3', '--win', '2', '--sub', '1e-2', '--dyn', '--workers', '3', 'corpus.gz']
+        self.assertEqual(self.run_script('corpus2pairs.py', *options), self.run_script('corpus2pairs.py', *options))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import struct
+import unittest
+
+import numpy as np
+
+from helpers import ScriptTestCase
+from representations.matrix_serializer import save_text_vectors, load_text_vectors, save_word2vec_binary, \
+    load_word2vec_binary
+
+
+def random_vectors(rows=57, dim=13, seed=17):
+    rnd = np.random.RandomState(seed)
+    m = (rnd.randn(rows, dim) * 10.0 ** rnd.randint(-3, 4, size=(rows, 1))).astype(np.float32)
+    return m, ['w%d' % i for i in xrange(rows)]
+
+
+def read_vectors(path, header):
+    """
+    The textual vectors as the original text2numpy.py parsed them, one float() per component.
+    """
+    vectors = []
+    with open(path) as f:
+        if header:
+            f.readline()
+        for line in f:
+            tokens = line.strip().split(' ')
+            vectors.append((tokens[0], [float(x) for x in tokens[1:]]))
+    return vectors
+
+
+class TextVectorsTest(ScriptTestCase):
+    """
+    Textual vectors written a block of rows at a time are read back exactly, with or without a header line, and
+    agree with the original one-float-at-a-time reader and writer.
+    """
+
+    def test_round_trip(self):
+        m, iw = random_vectors()
+        for header in [False, True]:
+            save_text_vectors(self.path('vectors.txt'), m, iw, header=header, chunk_size=10)
+            loaded, loaded_iw = load_text_vectors(self.path('vectors.txt'), chunk_size=7)
+            self.assertEqual(loaded_iw, iw)
+            self.assertTrue(np.array_equal(loaded, m))
+
+    def test_exact_by_default(self):
+        m, iw = random_vectors()
+        for vectors in [m, m.astype(np.float64) / 3]:
+            save_text_vectors(self.path('vectors.txt'), vectors, iw)
+            read = np.array([vector for w, vector in read_vectors(self.path('vectors.txt'), False)])
+            self.assertTrue(np.array_equal(read.astype(vectors.dtype), vectors))
+        save_text_vectors(self.path('vectors.txt'), m, iw, precision=3)
+        read = np.array([vector for w, vector in read_vectors(self.path('vectors.txt'), False)])
+        self.assertFalse(np.array_equal(read.astype(np.float32), m))
+        self.assertTrue(np.allclose(read, m, rtol=1e-2, atol=0))
+
+    def test_original_reader(self):
+        m, iw = random_vectors()
+        save_text_vectors(self.path('vectors.txt'), m, iw, header=True)
+        vectors = read_vectors(self.path('vectors.txt'), True)
+        self.assertEqual([w for w, vector in vectors], iw)
+        self.assertTrue(np.allclose(np.array([vector for w, vector in vectors]), m, rtol=1e-7, atol=0))
+
+    def test_original_writer(self):
+        m, iw = random_vectors()
+        with open(self.path('vectors.txt'), 'w') as f:
+            for i, w in enumerate(iw):
+                print >>f, w, ' '.join([str(x) for x in m[i]])
+        loaded, loaded_iw = load_text_vectors(self.path('vectors.txt'))
+        self.assertEqual(loaded_iw, iw)
+        expected = np.array([vector for w, vector in read_vectors(self.path('vectors.txt'), False)], dtype=np.float32)
+        self.assertTrue(np.array_equal(loaded, expected))
+
+    def test_text2numpy(self):
+        m, iw = random_vectors()
+        save_text_vectors(self.path('vectors.txt'), m, iw, header=True)
+        self.run_script('text2numpy.py', 'vectors.txt')
+        self.assertTrue(np.array_equal(np.load(self.path('vectors.txt.npy')), m))
+        with open(self.path('vectors.txt.vocab')) as f:
+            self.assertEqual(f.read().split(), iw)
+        self.assertFalse(os.path.exists(self.path('vectors.txt.normalized')))
+
+
+def read_word2vec_binary(path):
+    """
+    Reads word2vec's binary format the way word2vec's distance.c does: a word up to a space, then dim floats.
+    """
+    vectors = []
+    with open(path, 'rb') as f:
+        rows, dim = [int(x) for x in f.readline().split()]
+        for i in xrange(rows):
+            word = ''
+            while True:
+                c = f.read(1)
+                if c == ' ':
+                    break
+                if c != '\n':
+                    word += c
+            vectors.append((word, list(struct.unpack('<%df' % dim, f.read(4 * dim)))))
+    return vectors
+
+
+class Word2VecBinaryTest(ScriptTestCase):
+    """
+    Vectors in word2vec's binary format are written as word2vec's own reader expects them and read back exactly.
+    """
+
+    def test_round_trip(self):
+        m, iw = random_vectors()
+        save_word2vec_binary(self.path('vectors.bin'), m, iw, chunk_size=10)
+        for chunk_size in [7, 1024 * 1024]:
+            loaded, loaded_iw = load_word2vec_binary(self.path('vectors.bin'), chunk_size)
+            self.assertEqual(loaded_iw, iw)
+            self.assertTrue(np.array_equal(loaded, m))
+
+    def test_reference_reader(self):
+        m, iw = random_vectors()
+        save_word2vec_binary(self.path('vectors.bin'), m, iw)
+        vectors = read_word2vec_binary(self.path('vectors.bin'))
+        self.assertEqual([w for w, vector in vectors], iw)
+        self.assertTrue(np.array_equal(np.array([vector for w, vector in vectors], dtype=np.float32), m))
+
+    def test_without_newlines(self):
+        m, iw = random_vectors()
+        with open(self.path('vectors.bin'), 'wb') as f:
+            f.write('%d %d\n' % m.shape)
+            for w, row in zip(iw, m):
+                f.write(w + ' ' + row.astype('<f4').tostring())
+        loaded, loaded_iw = load_word2vec_binary(self.path('vectors.bin'), 11)
+        self.assertEqual(loaded_iw, iw)
+        self.assertTrue(np.array_equal(loaded, m))
+
+    def test_text2numpy(self):
+        m, iw = random_vectors()
+        save_word2vec_binary(self.path('vectors.bin'), m, iw)
+        self.run_script('text2numpy.py', 'vectors.bin')
+        self.assertTrue(np.array_equal(np.load(self.path('vectors.bin.npy')), m))
+
+
+if __name__ == '__main__':
+    unittest.main()